@@ -2,13 +2,15 @@ import asyncio
 from logging.config import fileConfig
 
 from alembic import context
+from alembic.operations import ops
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncEngine
 
 from summary_bot.config import get_settings
-from summary_bot.models.base import Base
+from summary_bot.models import Base, load_models
+from summary_bot.partitions import default_partition_name, is_partition_name
 
 
 # this is the Alembic Config object, which provides
@@ -27,6 +29,8 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 
 
+# model modules are imported lazily, autogenerate needs every table
+load_models()
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -35,6 +39,36 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def include_name(name, type_, parent_names) -> bool:
+    # partitions are made by summary_bot.partitions, not by migrations
+    if type_ == "table":
+        return not is_partition_name(name, target_metadata)
+    return True
+
+
+def add_default_partitions(context, revision, directives) -> None:
+    """a new partitioned table gets its DEFAULT partition, so inserts
+    outside of the created ranges do not fail"""
+
+    upgrade_ops = directives[0].upgrade_ops
+    if upgrade_ops is None:
+        return
+    result = []
+    for op in upgrade_ops.ops:
+        result.append(op)
+        if isinstance(op, ops.CreateTableOp) and op.kw.get(
+            "postgresql_partition_by"
+        ):
+            name = default_partition_name(op.table_name)
+            result.append(
+                ops.ExecuteSQLOp(
+                    f'CREATE TABLE "{name}" PARTITION OF "{op.table_name}"'
+                    " DEFAULT"
+                )
+            )
+    upgrade_ops.ops = result
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -54,6 +88,8 @@ def run_migrations_offline() -> None:
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
         compare_type=True,
+        include_name=include_name,
+        process_revision_directives=add_default_partitions,
     )
 
     with context.begin_transaction():
@@ -65,6 +101,8 @@ def do_run_migrations(connection: Connection) -> None:
         connection=connection,
         target_metadata=target_metadata,
         compare_type=True,
+        include_name=include_name,
+        process_revision_directives=add_default_partitions,
     )
 
     with context.begin_transaction():
@@ -0,0 +1,70 @@
+"""python -m benchmarks [--output results.json] [--baseline old.json]
+
+Runs offline against an in-memory SQLite by default (needs aiosqlite),
+any other async url works too, e.g. a scratch Postgres database.
+The suite drops and creates its own `mats_bench_row` table."""
+
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from benchmarks.cases import build_suite
+from benchmarks.harness import (
+    add_report_args,
+    environment,
+    print_result,
+    report,
+    run_case,
+)
+
+SQLITE_MEMORY_URL = "sqlite+aiosqlite://"
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--url", default=SQLITE_MEMORY_URL)
+    parser.add_argument(
+        "-k",
+        dest="patterns",
+        action="append",
+        help="run cases with the substring in the name, repeatable",
+    )
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.05,
+        help="seconds, the calls per round are calibrated to it",
+    )
+    add_report_args(parser)
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> int:
+    engine_kwargs = {}
+    if args.url == SQLITE_MEMORY_URL:
+        # the same connection for every session, or the table is gone
+        engine_kwargs["poolclass"] = StaticPool
+    engine = create_async_engine(args.url, **engine_kwargs)
+    try:
+        suite = await build_suite(engine)
+        results = []
+        for case in suite.selected(args.patterns):
+            result = await run_case(case, args.repeat, args.min_time)
+            results.append(result)
+            print_result(result, args.repeat)
+    finally:
+        await engine.dispose()
+
+    return report(args, results, environment(args.url))
+
+
+def main(argv: list[str] | None = None) -> int:
+    return asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
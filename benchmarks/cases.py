@@ -0,0 +1,205 @@
+"""CRUD, model, schema mapping and column type hot paths"""
+
+import datetime
+from itertools import count
+
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from benchmarks.harness import Suite
+from benchmarks.models import (
+    BenchRow,
+    BenchRowCRUD,
+    BenchState,
+    BenchStateEnum,
+)
+from summary_bot.crud.base import map_to_schema_result
+from summary_bot.models.base import IntEnumType, MyDateTime, UnixTimestamp
+
+SEED_ROWS = 1000
+MAP_SIZES = (1, 10, 100, 1000)
+PAGE_SIZE = 100
+
+
+def seed_rows(size: int) -> list[dict]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        {
+            "serial": f"seed-{index}",
+            "name": f"device {index}",
+            "state": BenchState(index % len(BenchState)),
+            "seen_at": now,
+            "synced_at": now,
+        }
+        for index in range(size)
+    ]
+
+
+async def prepare(engine: AsyncEngine, crud: BenchRowCRUD) -> list[BenchRow]:
+    """a fresh table with SEED_ROWS rows, the rows are returned loaded"""
+
+    async with engine.begin() as conn:
+        await conn.run_sync(BenchRow.__table__.drop, checkfirst=True)
+        await conn.run_sync(BenchRow.__table__.create)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as s:
+        await crud.create_many(s, seed_rows(SEED_ROWS))
+        await s.commit()
+        return await crud.get_multi_raw(s, order_by=BenchRow.id.asc())
+
+
+def _add_crud_cases(
+    suite: Suite, engine: AsyncEngine, crud: BenchRowCRUD
+) -> None:
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    serials = count()
+
+    def new_obj() -> dict:
+        return {"serial": f"new-{next(serials)}", "state": BenchState.NEW}
+
+    def rolled_back(name: str, ops: int = 1):
+        """every call in its own session, writes are rolled back
+        so the table stays the same between rounds"""
+
+        def decorator(operation):
+            async def case():
+                async with sessions() as session:
+                    await operation(session)
+                    await session.rollback()
+
+            suite.add(name, ops=ops, is_async=True)(case)
+            return operation
+
+        return decorator
+
+    @rolled_back(f"crud.get_multi[{PAGE_SIZE}]")
+    async def get_multi(session):
+        await crud.get_multi(session, limit=PAGE_SIZE)
+
+    @rolled_back("crud.get_one")
+    async def get_one(session):
+        await crud.get_one(session, serial="seed-1")
+
+    @rolled_back("crud.create")
+    async def create(session):
+        await crud.create(session, obj_in=new_obj())
+
+    @rolled_back("crud.upsert_an_obj[update]")
+    async def upsert_existing(session):
+        await crud.upsert_an_obj(
+            session, ["serial"], {"serial": "seed-2", "name": "upserted"}
+        )
+
+    @rolled_back("crud.upsert_an_obj[insert]")
+    async def upsert_new(session):
+        await crud.upsert_an_obj(session, ["serial"], new_obj())
+
+    @rolled_back("crud.update")
+    async def update(session):
+        await crud.update(
+            session,
+            update_filter={"serial": "seed-3"},
+            update_values={"name": "updated"},
+        )
+
+    if engine.dialect.name == "postgresql":
+        # no column names for a VALUES alias and no arrays in sqlite
+        patches = [
+            {"id": index, "name": f"patched {index}"}
+            for index in range(1, PAGE_SIZE + 1)
+        ]
+
+        @rolled_back(f"crud.update_many[{PAGE_SIZE}]", ops=PAGE_SIZE)
+        async def update_many(session):
+            await crud.update_many(session, patches)
+
+        serials_in = [f"seed-{index}" for index in range(PAGE_SIZE)]
+
+        @rolled_back(f"crud.get_multi[serial__in={PAGE_SIZE}]")
+        async def get_multi_in(session):
+            await crud.get_multi(session, serial__in=serials_in)
+
+    @rolled_back("crud.delete")
+    async def delete(session):
+        await crud.delete(session, serial="seed-4")
+
+
+def _add_mapping_cases(
+    suite: Suite, crud: BenchRowCRUD, rows: list[BenchRow]
+) -> None:
+    for size in MAP_SIZES:
+        page = rows[:size]
+
+        @map_to_schema_result
+        async def mapped(self, page=page):
+            return page
+
+        suite.add(f"schema.map_to_schema_result[{size}]", is_async=True)(
+            lambda mapped=mapped: mapped(crud)
+        )
+
+    @map_to_schema_result
+    async def mapped_one(self):
+        return rows[0]
+
+    suite.add("schema.map_to_schema_result[one]", is_async=True)(
+        lambda: mapped_one(crud)
+    )
+
+
+def _add_model_cases(suite: Suite, rows: list[BenchRow]) -> None:
+    row = rows[0]
+    values = row.as_dict()
+    suite.add("model.as_dict")(row.as_dict)
+    suite.add("model.as_dict[exclude]")(lambda: row.as_dict("name", "id"))
+    suite.add("model.as_tuple")(row.as_tuple)
+    suite.add("model.from_dict")(lambda: BenchRow.from_dict(values))
+
+    size = MAP_SIZES[-1]
+    page = rows[:size]
+    values_list = [row.as_dict() for row in page]
+    suite.add(f"model.as_dicts[{size}]", ops=size)(
+        lambda: BenchRow.as_dicts(page)
+    )
+    suite.add(f"model.from_dicts[{size}]", ops=size)(
+        lambda: BenchRow.from_dicts(values_list)
+    )
+
+
+def _add_type_cases(suite: Suite, engine: AsyncEngine) -> None:
+    dialect = engine.dialect
+    now = datetime.datetime.now(datetime.timezone.utc)
+    text_now = now.isoformat()
+    native_state = IntEnumType(BenchState, storage="native")
+    for name, type_, value in (
+        ("UnixTimestamp", UnixTimestamp(), now),
+        ("UnixTimestamp[str]", UnixTimestamp(), text_now),
+        ("MyDateTime", MyDateTime(), now),
+        ("MyDateTime[str]", MyDateTime(), text_now),
+        ("IntEnumDecorator", BenchStateEnum(), BenchState.ACTIVE),
+        ("IntEnumType[native]", native_state, BenchState.ACTIVE),
+    ):
+        # the same processors as the execution gets
+        process = type_.dialect_impl(dialect).bind_processor(dialect)
+        suite.add(f"type.bind.{name}")(
+            lambda process=process, value=value: process(value)
+        )
+
+    for name, type_, value in (
+        ("UnixTimestamp", UnixTimestamp(), int(now.timestamp())),
+        ("IntEnumDecorator", BenchStateEnum(), 1),
+        ("IntEnumType[native]", native_state, "ACTIVE"),
+    ):
+        process = type_.dialect_impl(dialect).result_processor(dialect, None)
+        suite.add(f"type.result.{name}")(
+            lambda process=process, value=value: process(value)
+        )
+
+
+async def build_suite(engine: AsyncEngine) -> Suite:
+    suite = Suite()
+    crud = BenchRowCRUD()
+    rows = await prepare(engine, crud)
+    _add_crud_cases(suite, engine, crud)
+    _add_mapping_cases(suite, crud, rows)
+    _add_model_cases(suite, rows)
+    _add_type_cases(suite, engine)
+    return suite
@@ -0,0 +1,230 @@
+"""Timing loop, JSON results and comparison with a saved baseline"""
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import pydantic
+import sqlalchemy
+
+
+class Case(NamedTuple):
+    name: str
+    func: Callable[[], Any] | Callable[[], Awaitable[Any]]
+    is_async: bool
+    # operations per timed call, e.g. rows in a batch
+    ops: int = 1
+
+
+class Result(NamedTuple):
+    name: str
+    number: int
+    ops: int
+    # seconds per operation over `repeat` rounds of `number` calls
+    min: float
+    median: float
+    mean: float
+    stdev: float
+
+    def as_json(self) -> dict[str, Any]:
+        return self._asdict()
+
+
+class Comparison(NamedTuple):
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else 1.0
+
+
+class Suite:
+    def __init__(self):
+        self.cases: list[Case] = []
+
+    def add(self, name: str, ops: int = 1, is_async: bool = False):
+        def decorator(func):
+            self.cases.append(Case(name, func, is_async, ops))
+            return func
+
+        return decorator
+
+    def selected(self, patterns: list[str] | None) -> list[Case]:
+        if not patterns:
+            return list(self.cases)
+        return [
+            case
+            for case in self.cases
+            if any(pattern in case.name for pattern in patterns)
+        ]
+
+
+async def _call_async(func, number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        await func()
+    return time.perf_counter() - started
+
+
+def _call_sync(func, number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - started
+
+
+async def _timed(case: Case, number: int) -> float:
+    if case.is_async:
+        return await _call_async(case.func, number)
+    return _call_sync(case.func, number)
+
+
+async def calibrate(case: Case, min_time: float) -> int:
+    """calls per round so that a round takes at least `min_time`"""
+
+    number = 1
+    while True:
+        elapsed = await _timed(case, number)
+        if elapsed >= min_time or number >= 1_000_000:
+            return number
+        number *= 10 if elapsed < min_time / 10 else 2
+
+
+async def run_case(case: Case, repeat: int, min_time: float) -> Result:
+    number = await calibrate(case, min_time)
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            elapsed = await _timed(case, number)
+            timings.append(elapsed / number / case.ops)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return summarize(case.name, number, case.ops, timings)
+
+
+def summarize(
+    name: str, number: int, ops: int, timings: list[float]
+) -> Result:
+    return Result(
+        name,
+        number,
+        ops,
+        min(timings),
+        statistics.median(timings),
+        statistics.mean(timings),
+        statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    )
+
+
+def environment(database_url: str) -> dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "pydantic": pydantic.VERSION,
+        "database": database_url.split(":", 1)[0],
+    }
+
+
+def dump_results(
+    path: Path, results: list[Result], meta: dict[str, str]
+) -> None:
+    path.write_text(
+        json.dumps(
+            {
+                "meta": meta,
+                "results": {r.name: r.as_json() for r in results},
+            },
+            indent=2,
+        )
+    )
+
+
+def load_baseline(path: Path) -> dict[str, float]:
+    """case name -> best seconds per operation, the minimum is the least
+    sensitive to other load on the machine"""
+
+    data = json.loads(path.read_text())
+    return {
+        name: result["min"] for name, result in data["results"].items()
+    }
+
+
+def compare(
+    results: list[Result], baseline: dict[str, float]
+) -> list[Comparison]:
+    return [
+        Comparison(result.name, baseline[result.name], result.min)
+        for result in results
+        if result.name in baseline
+    ]
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def print_result(result: Result, repeat: int) -> None:
+    print(
+        f"{result.name:<40} min {format_time(result.min):>10}"
+        f"  median {format_time(result.median):>10}"
+        f"  ({result.number} x {repeat})"
+    )
+
+
+def check_baseline(
+    results: list[Result], path: Path, threshold: float
+) -> int:
+    """print the comparison, the number of regressions"""
+
+    regressions = 0
+    print()
+    for comparison in compare(results, load_baseline(path)):
+        regressed = comparison.ratio > 1 + threshold
+        regressions += regressed
+        print(
+            f"{comparison.name:<40} {format_time(comparison.baseline):>10}"
+            f" -> {format_time(comparison.current):>10}"
+            f"  x{comparison.ratio:.2f}{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def add_report_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--output", type=Path, help="write JSON results")
+    parser.add_argument(
+        "--baseline", type=Path, help="JSON results to compare with"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown of the best time to fail, 0.1 = 10%%",
+    )
+
+
+def report(
+    args: argparse.Namespace, results: list[Result], meta: dict[str, str]
+) -> int:
+    if args.output:
+        dump_results(args.output, results, meta)
+    if not args.baseline:
+        return 0
+    regressions = check_baseline(results, args.baseline, args.threshold)
+    return 1 if regressions else 0
@@ -0,0 +1,70 @@
+"""A table with every custom column type, only for benchmarks"""
+
+import datetime
+from enum import IntEnum
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import BigInteger, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from summary_bot.crud.base import CRUDBase
+from summary_bot.models import Base
+from summary_bot.models.base import (
+    BigIdDateBaseMixin,
+    IntEnumDecorator,
+    MyDateTime,
+    UnixTimestamp,
+)
+
+
+class BenchState(IntEnum):
+    NEW = 0
+    ACTIVE = 1
+    BLOCKED = 2
+
+
+class BenchStateEnum(metaclass=IntEnumDecorator, enumcls=BenchState):
+    cache_ok = True
+
+
+class BenchRow(BigIdDateBaseMixin, Base):
+    # only INTEGER PRIMARY KEY is autoincremented by SQLite
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    serial: Mapped[str] = mapped_column(String(64), unique=True)
+    name: Mapped[str | None]
+    state: Mapped[BenchState] = mapped_column(BenchStateEnum)
+    seen_at: Mapped[datetime.datetime | None] = mapped_column(UnixTimestamp)
+    synced_at: Mapped[datetime.datetime | None] = mapped_column(MyDateTime)
+
+    @classmethod
+    def filter_fields(cls) -> list[str]:
+        return ["serial", "state"]
+
+
+class BenchRowSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    serial: str
+    name: str | None = None
+    state: BenchState
+    seen_at: datetime.datetime | None = None
+    synced_at: datetime.datetime | None = None
+    created_at: datetime.datetime
+    last_modified: datetime.datetime
+
+
+class BenchRowCreateSchema(BaseModel):
+    serial: str
+    name: str | None = None
+    state: BenchState = BenchState.NEW
+    seen_at: datetime.datetime | None = None
+    synced_at: datetime.datetime | None = None
+
+
+class BenchRowCRUD(
+    CRUDBase[BenchRow, BenchRowSchema, BenchRowCreateSchema]
+):
+    pass
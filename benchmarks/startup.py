@@ -0,0 +1,113 @@
+"""python -m benchmarks.startup [--output startup.json] [--baseline old.json]
+
+Import and boot steps of a process (alembic, scripts, a new worker),
+each one timed in a fresh interpreter. No database is needed,
+the engine is created but never connected."""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.harness import (
+    add_report_args,
+    environment,
+    print_result,
+    report,
+    summarize,
+)
+from summary_bot.config import SETTINGS_SNAPSHOT_ENV, get_settings
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# name, setup, timed statement
+CASES = (
+    ("startup.import.config", "", "import summary_bot.config"),
+    (
+        "startup.get_settings",
+        "from summary_bot.config import get_settings",
+        "get_settings()",
+    ),
+    (
+        "startup.get_settings[snapshot]",
+        "from summary_bot.config import get_settings",
+        "get_settings()",
+    ),
+    ("startup.import.models", "", "import summary_bot.models"),
+    ("startup.import.db", "", "import summary_bot.db"),
+    ("startup.import.crud", "", "import summary_bot.crud.base"),
+    ("startup.import.app", "", "import summary_bot.main"),
+    (
+        "startup.engine",
+        "from summary_bot.db import get_engine",
+        "get_engine()",
+    ),
+    (
+        "startup.load_models",
+        "from summary_bot.models import load_models",
+        "load_models()",
+    ),
+)
+
+SCRIPT = """\
+import time
+{setup}
+started = time.perf_counter()
+{statement}
+print(time.perf_counter() - started)
+"""
+
+
+def run_once(setup: str, statement: str, env: dict[str, str]) -> float:
+    script = SCRIPT.format(setup=setup, statement=statement)
+    completed = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--repeat", type=int, default=10)
+    add_report_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key != SETTINGS_SNAPSHOT_ENV
+    }
+    snapshot_env = {
+        **env,
+        SETTINGS_SNAPSHOT_ENV: get_settings().model_dump_json(),
+    }
+    results = []
+    for name, setup, statement in CASES:
+        case_env = snapshot_env if name.endswith("[snapshot]") else env
+        try:
+            timings = [
+                run_once(setup, statement, case_env)
+                for _ in range(args.repeat)
+            ]
+        except subprocess.CalledProcessError as error:
+            # e.g. the generated model modules are missing
+            last_line = (error.stderr.strip().splitlines() or [""])[-1]
+            print(f"{name:<40} failed: {last_line}")
+            continue
+        result = summarize(name, 1, 1, timings)
+        results.append(result)
+        print_result(result, args.repeat)
+    return report(args, results, environment("none"))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,33 @@
 import sys
 
+import loguru
 import uvicorn
 
-from summary_bot.config import get_settings
+from summary_bot.config import get_settings, snapshot_settings
+from summary_bot.metrics import clear_snapshots
 
 
 def run_uvicorn(run_args: dict):
     uvicorn.run("summary_bot.main:app", **run_args)
 
 
+def prepare_metrics():
+    settings = get_settings()
+    if not settings.metrics.enabled or settings.app.worker_count < 2:
+        return
+    if settings.metrics.multiprocess_dir is None:
+        loguru.logger.warning(
+            "Metrics of one random worker per scrape, the counters jump:"
+            " set METRICS_MULTIPROCESS_DIR to sum up every worker"
+        )
+        return
+    clear_snapshots(settings.metrics.multiprocess_dir)
+
+
 def main():
+    # workers read the resolved settings instead of the dotenv files
+    snapshot_settings()
+    prepare_metrics()
     run_uvicorn(get_settings().uvicorn_kwargs)
 
 
@@ -1,5 +1,6 @@
 import logging
 
+import os
 import sys
 from functools import cache
 from pathlib import Path
@@ -29,9 +30,29 @@ class App(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
 
+    # uvicorn processes, 0 - one per available CPU
+    workers: int = Field(1, ge=0)
+    # auto - uvloop and httptools when they are installed
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    http: Literal["auto", "h11", "httptools"] = "auto"
+    backlog: int = Field(2048, ge=1)
+    timeout_keep_alive: int = Field(5, ge=0)
+    limit_concurrency: int | None = Field(None, ge=1)  # per worker
+    # seconds to finish the requests in flight on shutdown, None - forever
+    timeout_graceful_shutdown: int | None = Field(30, ge=0)
+
     class Config:
         env_prefix = "server_"
 
+    @property
+    def worker_count(self) -> int:
+        if self.workers:
+            return self.workers
+        if hasattr(os, "sched_getaffinity"):
+            # respects the CPU set of the container
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
 
 class Logging(BaseSettings):
     level: Literal[LOGGING_LEVELS] = "DEBUG"  # type: ignore
@@ -69,13 +90,61 @@ class DbSettings(BaseSettings):
     pg_creds: PostgresSettings = Field(default_factory=PostgresSettings)
     host: str = "localhost"
     port: str = "5432"
-    pool_size: int = 1  # just for async_session context
+
+    # QueuePool, per process
+    pool_size: int = Field(5, ge=1)
+    max_overflow: int = Field(10, ge=-1)  # -1 - no limit
+    pool_timeout: float = Field(30.0, gt=0)
+    pool_recycle: int = Field(-1, ge=-1)  # seconds, -1 - never
+    pool_pre_ping: bool = False
+    echo: bool | None = None  # None - echo on DEBUG log level
+    # seconds to wait for checked out connections on shutdown
+    pool_drain_timeout: float = Field(10.0, ge=0)
+
+    # asyncpg
+    statement_cache_size: int = Field(100, ge=0)
+    prepared_statement_cache_size: int = Field(100, ge=0)
+    command_timeout: float | None = Field(None, gt=0)
+    server_settings: dict[str, str] = {}
 
     driver_schema: str = "postgresql+asyncpg"
 
+    # read replicas, the same pool settings as for the primary
+    replica_urls: list[str] = []
+
     class Config:
         env_prefix = "database_"
 
+    @field_validator("replica_urls")
+    def replica_urls_schema(cls, value: list[str], info):
+        driver_schema = info.data.get("driver_schema", "")
+        for url in value:
+            assert url.startswith(f"{driver_schema}://"), (
+                f"replica url should use {driver_schema}"
+            )
+        return value
+
+    def engine_kwargs(self, debug: bool = False) -> dict:
+        connect_args = {
+            "statement_cache_size": self.statement_cache_size,
+            "prepared_statement_cache_size": (
+                self.prepared_statement_cache_size
+            ),
+        }
+        if self.command_timeout is not None:
+            connect_args["command_timeout"] = self.command_timeout
+        if self.server_settings:
+            connect_args["server_settings"] = self.server_settings
+        return {
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.pool_timeout,
+            "pool_recycle": self.pool_recycle,
+            "pool_pre_ping": self.pool_pre_ping,
+            "echo": debug if self.echo is None else self.echo,
+            "connect_args": connect_args,
+        }
+
     @property
     def db_url(self) -> PostgresDsn:
         return (
@@ -109,15 +178,63 @@ class Api(BaseSettings):
         env_prefix = "api_"
 
 
+class Metrics(BaseSettings):
+    enabled: bool = True
+    path: str = "/metrics"
+    slow_query_threshold: float = Field(1.0, ge=0)  # seconds, 0 - disabled
+    # normalized statement text is cut to this length for the label,
+    # a digest keeps the cut ones apart
+    statement_label_length: int = Field(160, ge=16)
+    # with several workers: a directory of this host for the series
+    # of every worker, a scrape of any of them sums them up
+    multiprocess_dir: str | None = None
+    multiprocess_interval: float = Field(5.0, gt=0)  # seconds
+
+    class Config:
+        env_prefix = "metrics_"
+
+
+class Retention(BaseSettings):
+    # purge as a background task of the app,
+    # `python -m summary_bot.retention` runs it either way
+    enabled: bool = False
+    # table name -> max age of rows as "30d" (utils.common.convert_time),
+    # overrides `retention_age` of the model, "" - keep forever
+    ages: dict[str, str] = {}
+    interval: str = "1h"  # between background runs
+    time_budget: str = "10m"  # per run, the rest waits for the next one
+    batch_size: int = Field(5000, ge=1)  # rows per DELETE and transaction
+    batch_sleep: float = Field(0.1, ge=0)  # seconds, lets replicas catch up
+    # expired partitions are kept as plain tables, e.g. to archive them
+    detach_partitions: bool = False
+
+    class Config:
+        env_prefix = "retention_"
+
+
 class Settings(BaseSettings):
     app: App = Field(default_factory=App)
     logging: Logging = Field(default_factory=Logging)
     db: DbSettings = Field(default_factory=DbSettings)
     api: Api = Field(default_factory=Api)
+    metrics: Metrics = Field(default_factory=Metrics)
+    retention: Retention = Field(default_factory=Retention)
 
     @property
     def uvicorn_kwargs(self) -> dict:
-        result = self.app.model_dump(include={"host", "port"})
+        result = self.app.model_dump(
+            include={
+                "host",
+                "port",
+                "loop",
+                "http",
+                "backlog",
+                "timeout_keep_alive",
+                "limit_concurrency",
+                "timeout_graceful_shutdown",
+            }
+        )
+        result["workers"] = self.app.worker_count
         result["log_level"] = self.logging.level_root.lower()
         return result
 
@@ -130,8 +247,11 @@ class AlembicSettings(BaseSettings):
     db: DbSettings = Field(default_factory=DbSettings)
 
 
-@cache
-def get_settings():
+# resolved settings as JSON, set by the parent process for its workers
+SETTINGS_SNAPSHOT_ENV = "SUMMARY_BOT_SETTINGS_SNAPSHOT"
+
+
+def _load_dotenv() -> None:
     if (env_settings := EnvSettings()).ignore:
         dotenv_path = None
     elif env_settings.is_env_path_abs:
@@ -139,9 +259,28 @@ def get_settings():
     else:
         dotenv_path = find_dotenv(env_settings.name)
     load_dotenv(dotenv_path)
+
+
+@cache
+def get_settings():
     if "alembic" in sys.argv[0]:
+        _load_dotenv()
         return AlembicSettings()
-    _settings = Settings()
+    if (snapshot := os.environ.get(SETTINGS_SNAPSHOT_ENV)) is not None:
+        # the dotenv values are already in the inherited environment
+        _settings = Settings.model_validate_json(snapshot)
+    else:
+        _load_dotenv()
+        _settings = Settings()
     if _settings.logging.need_to_set_root:
         logging.getLogger().setLevel(_settings.logging.int_root_log_level)
     return _settings
+
+
+def snapshot_settings() -> str:
+    """Put the resolved settings into the environment, so the worker
+    processes skip the dotenv search and parsing"""
+
+    snapshot = get_settings().model_dump_json()
+    os.environ[SETTINGS_SNAPSHOT_ENV] = snapshot
+    return snapshot
@@ -1,18 +1,89 @@
-from collections.abc import Iterable
-from functools import wraps
-from typing import Any, TypeVar, Generic, TypeAlias, Callable, Awaitable
+from collections.abc import AsyncIterator, Hashable, Iterable
+from functools import cache, cached_property, wraps
+from itertools import chain
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    NamedTuple,
+    TypeAlias,
+    TypeVar,
+)
 
 import loguru
-from pydantic import BaseModel
-from sqlalchemy import select, delete, update, func
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import (
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import Insert, insert as pg_insert
 from sqlalchemy.engine.cursor import CursorResult
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql import Select
 from sqlalchemy.sql.elements import OperatorExpression, UnaryExpression
 
 from summary_bot.config import get_settings, Settings
-from summary_bot.models import Base
+from summary_bot.crud.bulk import (
+    chunk_rows,
+    dedupe_by_keys,
+    dump_obj,
+    group_by_keys,
+    merge_by_keys,
+    primary_key_names,
+    refresh_expired,
+    update_by_primary_key,
+)
+from summary_bot.crud.date_bounds import (
+    invalidate_bounds,
+    observe_inserted,
+)
+from summary_bot.crud.estimate import (
+    plan_rows_estimate,
+    table_rows_estimate,
+)
+from summary_bot.crud.filters import (
+    bind_values,
+    bind_where,
+    filter_shape,
+    from_triples,
+    is_templated,
+    where_clause,
+)
+from summary_bot.crud.keyset import (
+    KeysetPage,
+    decode_cursor,
+    encode_cursor,
+    parse_order_fields,
+    seek_expression,
+)
+from summary_bot.crud.result_cache import (
+    MISSING,
+    ResultCache,
+    invalidate_model,
+    is_written,
+    register_cache,
+    result_key,
+)
+from summary_bot.crud.statement_cache import (
+    LIMIT_PARAM,
+    OFFSET_PARAM,
+    StatementCache,
+    order_key,
+)
+from summary_bot.crud.write_behind import WriteBehindBuffer
+from summary_bot.db import async_session, primary_reads, use_primary
+from summary_bot.metrics import timed
+from summary_bot.models import Base, codecs
+from summary_bot.models.base import BoundDbModel
 
 
 ModelType = TypeVar("ModelType", bound=Base)
@@ -29,32 +100,175 @@ CRUDBaseCommonMethodType: TypeAlias = (
 )
 
 
+_MISSING = object()
+_object_setattr = object.__setattr__
+
+
 class NoResultFoundEx(Exception):
     pass
 
 
+@cache
+def _list_adapter(schema: type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(list[schema])
+
+
+@cache
+def _schema_fields(schema: type[BaseModel]) -> tuple[str, ...]:
+    return tuple(schema.model_fields)
+
+
+def _as_python_type(column_type) -> codecs.Processor | None:
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return None
+    adapter = TypeAdapter(python_type)
+
+    def process(value):
+        if value is None or isinstance(value, python_type):
+            return value
+        return adapter.validate_python(value)
+
+    return process
+
+
+@cache
+def _key_processors(
+    model: type[Base], fields: tuple[str, ...], dialect
+) -> tuple[codecs.Processor | None, ...]:
+    """key values as the database returns them, e.g. a str to uuid.UUID
+    or a naive datetime to an aware one: the python type, then the bind
+    and the result processing of the column type"""
+
+    result = []
+    for field in fields:
+        column_type = getattr(model, field).type
+        impl = column_type.dialect_impl(dialect)
+        result.append(
+            codecs.chain(
+                _as_python_type(column_type),
+                codecs.chain(
+                    impl.bind_processor(dialect),
+                    impl.result_processor(dialect, None),
+                ),
+            )
+        )
+    return tuple(result)
+
+
+def construct_trusted(schema: type[BaseModel], row: Any) -> BaseModel:
+    """Schema from already typed attributes of a db row without
+    validation. Nested schemas are not converted, flat schemas only."""
+
+    fields = _schema_fields(schema)
+    values = {}
+    for field in fields:
+        value = getattr(row, field, _MISSING)
+        if value is not _MISSING:
+            values[field] = value
+    if len(values) != len(fields) or schema.__private_attributes__:
+        # defaults and private attributes are filled by pydantic
+        return schema.model_construct(**values)
+
+    # model_construct without the defaults and extra handling
+    obj = schema.__new__(schema)
+    _object_setattr(obj, "__dict__", values)
+    _object_setattr(obj, "__pydantic_fields_set__", set(fields))
+    _object_setattr(obj, "__pydantic_extra__", None)
+    _object_setattr(obj, "__pydantic_private__", None)
+    return obj
+
+
 def map_to_schema_result(func) -> ():
     @wraps(func)
     async def wrapper(*args, **kwargs):
         result = await func(*args, **kwargs)
         self: CRUDBase = args[0]
 
-        # just a crazy hack for grabbing a generic class
-        get_schema: GetSchemaType = self.__orig_bases__[0].__args__[1]
-
         if isinstance(result, Iterable):
-            return [get_schema.model_validate(res) for res in result]
-        return get_schema.model_validate(result)
+            return self._map_many(result)
+        return self._map_one(result)
+
+    return wrapper
+
+
+def read_through(func):
+    """Serve the call from the CRUD result cache when it is enabled"""
+
+    @wraps(func)
+    async def wrapper(self: "CRUDBase", session, *args, **kwargs):
+        cache = self._result_cache
+        if cache is None or is_written(session, self._model):
+            return await func(self, session, *args, **kwargs)
+        key = result_key(func.__name__, args, kwargs)
+        if key is None:
+            return await func(self, session, *args, **kwargs)
+        result = cache.get(key)
+        if result is MISSING:
+            # a lagging replica would keep old rows for the whole TTL
+            with primary_reads(session):
+                result = await func(self, session, *args, **kwargs)
+            cache.set(key, result)
+        return result
+
+    return wrapper
+
+
+def write_operation(func):
+    """Keep the session on the primary, the reads of the method
+    must not see a lagging replica, and clear result caches"""
+
+    @wraps(func)
+    async def wrapper(self: "CRUDBase", session, *args, **kwargs):
+        use_primary(session)
+        try:
+            return await func(self, session, *args, **kwargs)
+        finally:
+            invalidate_model(session, self._model)
 
     return wrapper
 
 
+TOTAL_COUNT_LABEL = "x_total_count"
+
+
+class CountedPage(NamedTuple):
+    items: list
+    total: int
+
+
 UpdateFilter: TypeAlias = (
     dict[str, Any] | list[OperatorExpression] | OperatorExpression
 )
 
 
 class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
+    # build schemas from rows without validation, see `construct_trusted`
+    trusted_rows: bool = False
+    statement_cache_size: int = 256
+    _statement_cache: StatementCache = StatementCache(statement_cache_size)
+    # read-through cache of get_one / get_multi, 0 - disabled;
+    # for rarely changed tables, cleared by any write of the model
+    result_cache_size: int = 0
+    result_cache_ttl: float = 60.0
+    _result_cache: ResultCache | None = None
+    # seconds to coalesce bumps and `update_later` patches by primary
+    # key before one batched UPDATE, 0 - disabled (written at once)
+    write_behind_window: float = 0.0
+    write_behind_max_pending: int = 10_000
+    _write_behind: WriteBehindBuffer | None = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._statement_cache = StatementCache(cls.statement_cache_size)
+        cls._result_cache = None
+        cls._write_behind = None
+        if cls.result_cache_size:
+            cls._result_cache = ResultCache(
+                cls.result_cache_size, cls.result_cache_ttl
+            )
+
     def __init__(self, settings: Settings = None):
         """
         CRUD object with default methods to
@@ -66,11 +280,37 @@ class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
 
         self._settings = settings or get_settings()
 
-        base = self.__orig_bases__[0]
-        model, get_schema, create_schema = base.__args__[:3]
+        model, get_schema, create_schema = self._generic_args()
         self._model: ModelType = model
         self._get_schema: GetSchemaType = get_schema
         self._create_schema: CreateSchemaType = create_schema
+        if self._result_cache is not None:
+            register_cache(model, self._result_cache)
+        if self.write_behind_window and self._write_behind is None:
+            type(self)._write_behind = WriteBehindBuffer(
+                model,
+                self.write_behind_window,
+                self.write_behind_max_pending,
+                after_flush=self._after_write_behind,
+            )
+
+    @classmethod
+    @cache
+    def _generic_args(cls) -> tuple[type, type, type]:
+        # just a crazy hack for grabbing a generic class
+        return cls.__orig_bases__[0].__args__[:3]
+
+    def _map_one(self, row: Any) -> GetSchemaType:
+        if self.trusted_rows:
+            return construct_trusted(self._get_schema, row)
+        return self._get_schema.model_validate(row)
+
+    def _map_many(self, rows: Iterable[Any]) -> list[GetSchemaType]:
+        if self.trusted_rows:
+            return [construct_trusted(self._get_schema, row) for row in rows]
+        return _list_adapter(self._get_schema).validate_python(
+            rows, from_attributes=True
+        )
 
     @property
     def model(self):
@@ -85,26 +325,69 @@ class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
         return self._create_schema
 
     def _generate_where_cause(self, filter_dict: dict[str, Any] | None = None):
-        filter_dict = filter_dict or {}
-        return [
-            getattr(self._model, field) == value
-            for field, value in filter_dict.items()
-        ]
+        """"field" and "field__<lookup>" keys, see `crud.filters`"""
+
+        return where_clause(self._model, filter_dict or {})
 
     @property
     def _select_model(self) -> Select | None:
         """can be used for config options with inload"""
         return select(self._model)
 
-    @property
+    @cached_property
     def _has_custom_base(self):
-        return self._select_model != select(self._model)
+        return (
+            self._select_model._generate_cache_key()
+            != select(self._model)._generate_cache_key()
+        )
+
+    def _touches_bound_date(self, update_values: dict[str, Any]) -> bool:
+        if not issubclass(self._model, BoundDbModel):
+            return False
+        column = self._model.bound_date_column()
+        return column.key in update_values or (
+            self._model.__table__.columns[column.key].onupdate is not None
+        )
+
+    def _after_write_behind(
+        self, session: AsyncSession, keys: tuple[str, ...]
+    ) -> None:
+        invalidate_model(session, self._model)
+        if self._touches_bound_date(dict.fromkeys(keys)):
+            invalidate_bounds(session, self._model)
+
+    def _primary_key_of(self, row_filter: Any) -> dict[str, Any] | None:
+        # write behind needs exactly the primary key in a dict filter
+        if not isinstance(row_filter, dict):
+            return None
+        keys = primary_key_names(self._model)
+        return row_filter if row_filter.keys() == set(keys) else None
+
+    @property
+    def statement_cache_stats(self) -> dict[str, int]:
+        return self._statement_cache.stats
+
+    @property
+    def result_cache_stats(self) -> dict[str, int | float] | None:
+        if self._result_cache is None:
+            return None
+        return self._result_cache.stats
+
+    def _templated_stmt(
+        self, key: Hashable, build: Callable[[], Select]
+    ) -> Select:
+        return self._statement_cache.get((self._model, *key), build)
 
     def _resolve_filter(
         self, filter_: UpdateFilter
     ) -> list[OperatorExpression]:
         if isinstance(filter_, dict):
             filter_ = self._generate_where_cause(filter_)
+        elif isinstance(filter_, list) and any(
+            isinstance(item, tuple) for item in filter_
+        ):
+            # (column, ComparisonType, value) triples of FilterType
+            filter_ = self._generate_where_cause(from_triples(filter_))
 
         if not isinstance(filter_, Iterable):
             filter_ = [filter_]
@@ -124,47 +407,300 @@ class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
 
         return operator_expressions or ()
 
-    async def get_multi_raw(
+    def _get_multi_stmt(
         self,
-        session: AsyncSession,
         offset: int = 0,
         limit: int | None = None,
         order_by: UnaryExpression | None = None,
         operator_expressions: list[OperatorExpression] | None = None,
-        scalars: bool = True,
-        unique: bool = False,
+        with_total: bool = False,
         **filter_dict: ...,
-    ) -> list[ModelType]:
-        stmt = self._select_model.where(
-            *self._resolve_operator_expressions(
-                operator_expressions, **filter_dict
+    ) -> tuple[Select, dict[str, Any]]:
+        """Statement and its params. Plain equality filters reuse
+        a cached statement shape with bound values."""
+
+        order = order_key(order_by)
+        shape = filter_shape(filter_dict)
+        if (
+            operator_expressions is None
+            and order is not None
+            and is_templated(self._model, shape)
+        ):
+
+            def build() -> Select:
+                return self._build_multi_stmt(
+                    bindparam(OFFSET_PARAM),
+                    None if limit is None else bindparam(LIMIT_PARAM),
+                    order_by,
+                    bind_where(self._model, shape),
+                    with_total,
+                )
+
+            stmt = self._templated_stmt(
+                ("multi", shape, limit is None, order, with_total), build
             )
+            params = bind_values(filter_dict)
+            params[OFFSET_PARAM] = offset
+            if limit is not None:
+                params[LIMIT_PARAM] = limit
+            return stmt, params
+
+        where = self._resolve_operator_expressions(
+            operator_expressions, **filter_dict
         )
+        stmt = self._build_multi_stmt(
+            offset, limit, order_by, where, with_total
+        )
+        return stmt, {}
+
+    def _build_multi_stmt(
+        self, offset, limit, order_by, where, with_total
+    ) -> Select:
+        stmt = self._select_model.where(*where)
         stmt = stmt.offset(offset)
         if limit is not None:
             stmt = stmt.limit(limit)
         if order_by is not None:
             stmt = stmt.order_by(order_by)
-        result = await session.execute(stmt)
+        if with_total:
+            stmt = stmt.add_columns(
+                func.count().over().label(TOTAL_COUNT_LABEL)
+            )
+        return stmt
+
+    @timed
+    async def get_multi_raw(
+        self,
+        session: AsyncSession,
+        offset: int = 0,
+        limit: int | None = None,
+        order_by: UnaryExpression | None = None,
+        operator_expressions: list[OperatorExpression] | None = None,
+        scalars: bool = True,
+        unique: bool = False,
+        **filter_dict: ...,
+    ) -> list[ModelType]:
+        stmt, params = self._get_multi_stmt(
+            offset, limit, order_by, operator_expressions, **filter_dict
+        )
+        result = await session.execute(stmt, params)
         if unique:
             result = result.unique()
         if scalars:
             result = result.scalars()
         return result.all()
 
+    async def stream_multi_raw(
+        self,
+        session: AsyncSession,
+        yield_per: int = 1000,
+        offset: int = 0,
+        limit: int | None = None,
+        order_by: UnaryExpression | None = None,
+        operator_expressions: list[OperatorExpression] | None = None,
+        **filter_dict: ...,
+    ) -> AsyncIterator[list[ModelType]]:
+        """Yield models in chunks of `yield_per` rows read
+        from a server-side cursor, only one chunk is held in memory"""
+
+        stmt, params = self._get_multi_stmt(
+            offset, limit, order_by, operator_expressions, **filter_dict
+        )
+        result = await session.stream(
+            stmt, params, execution_options={"yield_per": yield_per}
+        )
+        try:
+            async for partition in result.scalars().partitions():
+                yield partition
+        finally:
+            await result.close()
+
+    async def stream_multi(
+        self,
+        session: AsyncSession,
+        yield_per: int = 1000,
+        offset: int = 0,
+        limit: int | None = None,
+        order_by: UnaryExpression | None = None,
+        operator_expressions: list[OperatorExpression] | None = None,
+        **filter_dict: ...,
+    ) -> AsyncIterator[GetSchemaType]:
+        """The same filters and ordering as `get_multi`,
+        but validated schemas are yielded chunk by chunk"""
+
+        async for partition in self.stream_multi_raw(
+            session,
+            yield_per=yield_per,
+            offset=offset,
+            limit=limit,
+            order_by=order_by,
+            operator_expressions=operator_expressions,
+            **filter_dict,
+        ):
+            for schema in self._map_many(partition):
+                yield schema
+
+    @timed
+    async def get_multi_keyset_raw(
+        self,
+        session: AsyncSession,
+        limit: int,
+        cursor: str | None = None,
+        order_fields: list[str] | None = None,
+        operator_expressions: list[OperatorExpression] | None = None,
+        unique: bool = False,
+        **filter_dict: ...,
+    ) -> KeysetPage:
+        """Seek pagination: the page is found by an index range scan
+        after the last seen row instead of skipping `offset` rows.
+        `order_fields` are names from model `order_fields()`
+        with optional "desc_" prefix, `default_order_fields()` if None"""
+
+        order = parse_order_fields(self._model, order_fields)
+        where = list(
+            self._resolve_operator_expressions(
+                operator_expressions, **filter_dict
+            )
+        )
+        if cursor is not None:
+            where.append(
+                seek_expression(order, decode_cursor(order, cursor))
+            )
+        stmt = (
+            self._select_model.where(*where)
+            .order_by(*(o.expression for o in order))
+            .limit(limit + 1)
+        )
+        result = (await session.execute(stmt)).scalars()
+        if unique:
+            result = result.unique()
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(order, rows[-1])
+        return KeysetPage(rows, next_cursor)
+
+    @timed
+    async def get_multi_keyset(
+        self,
+        session: AsyncSession,
+        limit: int,
+        cursor: str | None = None,
+        order_fields: list[str] | None = None,
+        operator_expressions: list[OperatorExpression] | None = None,
+        **filter_dict: ...,
+    ) -> KeysetPage:
+        page = await self.get_multi_keyset_raw(
+            session=session,
+            limit=limit,
+            cursor=cursor,
+            order_fields=order_fields,
+            operator_expressions=operator_expressions,
+            **filter_dict,
+        )
+        return KeysetPage(
+            self._map_many(page.items),
+            page.next_cursor,
+        )
+
+    @timed
     async def get_count(
         self,
         session: AsyncSession,
         operator_expressions: list[OperatorExpression] | None = None,
+        estimate_threshold: int | None = None,
         **filter_dict: ...,
     ) -> int:
-        stmt = select(func.count()).where(
-            *self._resolve_operator_expressions(
-                operator_expressions, **filter_dict
+        """With `estimate_threshold` the planner estimate is returned
+        when it is not less than the threshold: pg_class.reltuples
+        without filters or EXPLAIN row estimate with filters.
+        Small results are counted exactly."""
+
+        where = self._resolve_operator_expressions(
+            operator_expressions, **filter_dict
+        )
+        if estimate_threshold is not None:
+            if where:
+                estimate = await plan_rows_estimate(
+                    session, select(1).select_from(self._model).where(*where)
+                )
+            else:
+                estimate = await table_rows_estimate(
+                    session, self._model.__table__.fullname
+                )
+            if estimate is not None and estimate >= estimate_threshold:
+                return estimate
+
+        shape = filter_shape(filter_dict)
+        if operator_expressions is None and is_templated(self._model, shape):
+            stmt = self._templated_stmt(
+                ("count", shape),
+                lambda: select(func.count())
+                .select_from(self._model)
+                .where(*bind_where(self._model, shape)),
             )
+            params = bind_values(filter_dict)
+        else:
+            stmt = select(func.count()).select_from(self._model).where(*where)
+            params = {}
+        return (await session.execute(stmt, params)).scalar()
+
+    @timed
+    async def get_multi_with_total_raw(
+        self,
+        session: AsyncSession,
+        offset: int = 0,
+        limit: int | None = None,
+        order_by: UnaryExpression | None = None,
+        operator_expressions: list[OperatorExpression] | None = None,
+        **filter_dict: ...,
+    ) -> CountedPage:
+        """A page and the total filtered count with one query
+        through the count(*) OVER () window"""
+
+        stmt, params = self._get_multi_stmt(
+            offset,
+            limit,
+            order_by,
+            operator_expressions,
+            with_total=True,
+            **filter_dict,
+        )
+        rows = (await session.execute(stmt, params)).all()
+        if rows:
+            return CountedPage([row[0] for row in rows], rows[0][-1])
+        if not offset:
+            return CountedPage([], 0)
+        # the offset is behind the last row - no window to read from
+        total = await self.get_count(
+            session, operator_expressions, **filter_dict
         )
-        return (await session.execute(stmt)).scalar()
+        return CountedPage([], total)
 
+    @timed
+    async def get_multi_with_total(
+        self,
+        session: AsyncSession,
+        offset: int = 0,
+        limit: int | None = None,
+        order_by: UnaryExpression | None = None,
+        operator_expressions: list[OperatorExpression] | None = None,
+        **filter_dict: ...,
+    ) -> CountedPage:
+        page = await self.get_multi_with_total_raw(
+            session=session,
+            offset=offset,
+            limit=limit,
+            order_by=order_by,
+            operator_expressions=operator_expressions,
+            **filter_dict,
+        )
+        return CountedPage(self._map_many(page.items), page.total)
+
+    @timed
+    @read_through
     @map_to_schema_result
     async def get_multi(
         self,
@@ -184,19 +720,33 @@ class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
             **filter_dict,
         )
 
+    @timed
     async def get_one_raw(
         self,
         session: AsyncSession,
         operator_expressions: list[OperatorExpression] | None = None,
         **filter_dict: ...,
     ) -> ModelType:
-        stmt = self._select_model.where(
-            *self._resolve_operator_expressions(
-                operator_expressions, **filter_dict
+        shape = filter_shape(filter_dict)
+        if operator_expressions is None and is_templated(self._model, shape):
+            stmt = self._templated_stmt(
+                ("one", shape),
+                lambda: self._select_model.where(
+                    *bind_where(self._model, shape)
+                ),
             )
-        )
-        return (await session.execute(stmt)).scalars().one()
+            params = bind_values(filter_dict)
+        else:
+            stmt = self._select_model.where(
+                *self._resolve_operator_expressions(
+                    operator_expressions, **filter_dict
+                )
+            )
+            params = {}
+        return (await session.execute(stmt, params)).scalars().one()
 
+    @timed
+    @read_through
     @map_to_schema_result
     async def get_one(
         self,
@@ -213,20 +763,28 @@ class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
         session: AsyncSession, models: list[ModelType], commit=False
     ) -> list[ModelType]:
         session.add_all(models)
+        use_primary(session)
+        for model_cls in {type(model) for model in models}:
+            invalidate_model(session, model_cls)
         if not commit:
             await session.flush(models)
             return models
         await session.commit()
-        for model in models:
-            await session.refresh(model)
+        await refresh_expired(session, models)
         return models
 
+    def _get_by_pk_filter(self, db_obj: ModelType) -> dict[str, Any]:
+        pk_name = getattr(db_obj, "pk_name", "id")
+        return {pk_name: getattr(db_obj, pk_name)}
+
     def _get_by_pk_expression(self, db_obj: ModelType):
         pk_name = getattr(db_obj, "pk_name", "id")
         pk_column = getattr(self.model, pk_name)
         pk_value = getattr(db_obj, pk_name)
         return [pk_column == pk_value]
 
+    @timed
+    @write_operation
     async def create(
         self, session: AsyncSession, *, obj_in: dict | CreateSchemaType
     ) -> ModelType:
@@ -242,23 +800,64 @@ class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
             return db_obj
 
         return await self.get_one_raw(
-            session, operator_expressions=self._get_by_pk_expression(db_obj)
+            session, **self._get_by_pk_filter(db_obj)
         )
 
+    @timed
+    @write_operation
+    async def create_many(
+        self,
+        session: AsyncSession,
+        objs: list[dict | CreateSchemaType],
+        batch_size: int = 1000,
+        as_schema: bool = False,
+    ) -> list[ModelType] | list[GetSchemaType]:
+        """Bulk INSERT ... RETURNING: server defaults (ids, created_at)
+        come back with the insert, `batch_size` rows per round trip.
+        The result keeps the order of `objs`."""
+
+        stmt = insert(self._model).returning(
+            self._model, sort_by_parameter_order=True
+        )
+        # the ORM splits executemany on every change of the key set
+        indexes = {}
+        for index, obj in enumerate(map(dump_obj, objs)):
+            indexes.setdefault(tuple(sorted(obj)), []).append((index, obj))
+
+        result = [None] * len(objs)
+        for keys, group in indexes.items():
+            for chunk in chunk_rows(group, len(keys), max_rows=batch_size):
+                db_objs = await session.scalars(
+                    stmt,
+                    [obj for _, obj in chunk],
+                    execution_options={
+                        "insertmanyvalues_page_size": batch_size
+                    },
+                )
+                for (index, _), db_obj in zip(chunk, db_objs):
+                    result[index] = db_obj
+        observe_inserted(session, self._model, result)
+        if as_schema:
+            return self._map_many(result)
+        return result
+
+    @timed
     @map_to_schema_result
     async def create_with_commit(
         self, session: AsyncSession, *, obj_in: dict | CreateSchemaType
     ) -> GetSchemaType:
         db_obj = await self.create(session, obj_in=obj_in)
         await session.commit()
-        await session.refresh(db_obj)
+        await refresh_expired(session, [db_obj])
         if not self._has_custom_base:
             return db_obj
         res = await self.get_one_raw(
-            session, operator_expressions=self._get_by_pk_expression(db_obj)
+            session, **self._get_by_pk_filter(db_obj)
         )
         return res
 
+    @timed
+    @write_operation
     async def update(
         self,
         session: AsyncSession,
@@ -281,8 +880,76 @@ class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
             .values(**update_values)
         )
         result: CursorResult = await session.execute(update_stmt)
+        if self._touches_bound_date(update_values):
+            invalidate_bounds(session, self._model)
         return result.rowcount
 
+    def _sync_loaded(
+        self,
+        session: AsyncSession,
+        pk_keys: tuple[str, ...],
+        rows: list[dict[str, Any]],
+    ) -> None:
+        # as synchronize_session="evaluate" of `update`, without
+        # expiring loaded objects, async code can not lazy load them
+        identity_map = session.identity_map
+        if not identity_map:
+            return
+        for row in rows:
+            key = identity_key(
+                self._model, tuple(row[pk] for pk in pk_keys)
+            )
+            db_obj = identity_map.get(key)
+            if db_obj is None:
+                continue
+            for field, value in row.items():
+                set_committed_value(db_obj, field, value)
+
+    @timed
+    @write_operation
+    async def update_many(
+        self,
+        session: AsyncSession,
+        rows: list[dict[str, Any] | BaseModel],
+        is_patch=True,
+    ) -> int:
+        """Per row values found by the primary key each row holds,
+        one UPDATE ... FROM (VALUES ...) per key set and chunk.
+        A schema row sets the fields it was given (None included),
+        None values of a dict row are skipped with is_patch as in
+        `update`. Rows of one key are merged, the later values win."""
+
+        pk_keys = primary_key_names(self._model)
+        patches = []
+        for row in rows:
+            if isinstance(row, BaseModel):
+                row = dump_obj(row, exclude_none=False, exclude_unset=True)
+            elif is_patch:
+                row = {k: v for k, v in row.items() if v is not None}
+            if any(row.get(key) is None for key in pk_keys):
+                raise ValueError(
+                    f"Got a row without primary key {pk_keys}"
+                    f" in CRUD={self.__class__.__name__}"
+                )
+            patches.append(row)
+        patches = merge_by_keys(patches, list(pk_keys))
+
+        rowcount = 0
+        for keys, group in group_by_keys(patches).items():
+            keys = tuple(key for key in keys if key not in pk_keys)
+            for chunk in chunk_rows(group, len(pk_keys) + len(keys)):
+                result: CursorResult = await session.execute(
+                    update_by_primary_key(self._model, keys, chunk),
+                    execution_options={"synchronize_session": False},
+                )
+                rowcount += result.rowcount
+        self._sync_loaded(session, pk_keys, patches)
+        if self._touches_bound_date(dict.fromkeys(chain(*patches))):
+            invalidate_bounds(session, self._model)
+        return rowcount
+
+    @timed
+    @write_operation
     async def upsert_an_obj(
         self,
         session,
@@ -305,32 +972,222 @@ class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
             except NoResultFound:
                 return await self.create(session, obj_in=obj_in)
 
-    async def get_or_create(
+    def _upsert_set(
         self,
-        session,
-        filter_fields: list[str],
-        obj_in: dict | CreateSchemaType,
-    ) -> ModelType:
-        if isinstance(obj_in, BaseModel):
-            obj_in = obj_in.model_dump(exclude_none=True)
+        stmt: Insert,
+        keys: tuple[str, ...],
+        conflict_fields: list[str],
+    ) -> dict[str, Any]:
+        primary_key = self._model.__table__.primary_key.columns.keys()
+        skip = {*conflict_fields, *primary_key}
+        set_ = {key: stmt.excluded[key] for key in keys if key not in skip}
+        for column in self._model.__table__.columns:
+            onupdate = column.onupdate
+            if (
+                column.name not in set_
+                and onupdate is not None
+                and onupdate.is_clause_element
+            ):
+                set_[column.name] = onupdate.arg
+        if not set_:
+            # noop update, so RETURNING still gives the existing row
+            key = conflict_fields[0]
+            set_[key] = stmt.excluded[key]
+        return set_
+
+    @timed
+    @write_operation
+    async def upsert_many(
+        self,
+        session: AsyncSession,
+        conflict_fields: list[str],
+        objs: list[dict | CreateSchemaType],
+        as_schema: bool = False,
+    ) -> list[ModelType] | list[GetSchemaType]:
+        """Batched INSERT ... ON CONFLICT (conflict_fields) DO UPDATE
+        RETURNING. `conflict_fields` must match a unique index.
+        Rows with the same key set are sent together, chunked under
+        the asyncpg parameter limit; the result order is not the input
+        order."""
+
+        if not conflict_fields:
+            raise ValueError(
+                f"Got empty conflict fields in CRUD={self.__class__.__name__}"
+            )
+        rows = dedupe_by_keys(map(dump_obj, objs), conflict_fields)
+        result = []
+        for keys, group in group_by_keys(rows).items():
+            for chunk in chunk_rows(group, len(keys)):
+                stmt = pg_insert(self._model).values(chunk)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=conflict_fields,
+                    set_=self._upsert_set(stmt, keys, conflict_fields),
+                ).returning(self._model)
+                result.extend(
+                    await session.scalars(
+                        stmt,
+                        execution_options={"populate_existing": True},
+                    )
+                )
+        if self._touches_bound_date(dict.fromkeys(chain(*rows))):
+            # an updated row could be the one on the bound
+            invalidate_bounds(session, self._model)
+        else:
+            observe_inserted(session, self._model, result)
+        if as_schema:
+            return self._map_many(result)
+        return result
+
+    def _filter_dict(
+        self, filter_fields: list[str], obj_in: dict[str, Any]
+    ) -> dict[str, Any]:
         filter_dict = {k: v for k, v in obj_in.items() if k in filter_fields}
         if not filter_dict:
             loguru.logger.warning("Got empty filter dict - ERROR")
             raise ValueError(
                 f"Got empty filter dict in CRUD={self.__class__.__name__}"
             )
-        try:
+        return filter_dict
+
+    def _keys_filter(
+        self, filter_fields: list[str], keys: list[tuple]
+    ) -> OperatorExpression:
+        if len(filter_fields) == 1:
+            column = getattr(self._model, filter_fields[0])
+            return column.in_([key[0] for key in keys])
+        columns = [getattr(self._model, field) for field in filter_fields]
+        return tuple_(*columns).in_(keys)
+
+    @timed
+    @write_operation
+    async def get_or_create(
+        self,
+        session,
+        filter_fields: list[str],
+        obj_in: dict | CreateSchemaType,
+    ) -> ModelType:
+        """INSERT ... ON CONFLICT (filter_fields) DO NOTHING RETURNING,
+        the existing row is selected only on conflict.
+        `filter_fields` must match a unique index."""
+
+        obj_in = dump_obj(obj_in)
+        filter_dict = self._filter_dict(filter_fields, obj_in)
+        stmt = (
+            pg_insert(self._model)
+            .values(obj_in)
+            .on_conflict_do_nothing(index_elements=list(filter_dict))
+            .returning(self._model)
+        )
+        db_obj = (await session.scalars(stmt)).one_or_none()
+        if db_obj is None:
             return await self.get_one_raw(session, **filter_dict)
-        except NoResultFound:
-            return await self.create(session, obj_in=obj_in)
+        observe_inserted(session, self._model, [db_obj])
+        if not self._has_custom_base:
+            return db_obj
+        return await self.get_one_raw(
+            session, **self._get_by_pk_filter(db_obj)
+        )
+
+    @timed
+    @write_operation
+    async def get_or_create_many(
+        self,
+        session: AsyncSession,
+        filter_fields: list[str],
+        objs: list[dict | CreateSchemaType],
+    ) -> list[ModelType]:
+        """Batched `get_or_create`: one insert per chunk of new keys
+        and one select per chunk of conflicting keys.
+        The result is aligned with `objs`, duplicated keys
+        share the same model."""
+
+        objs = [dump_obj(obj) for obj in objs]
+        for obj in objs:
+            self._filter_dict(filter_fields, obj)
 
+        processors = _key_processors(
+            self._model,
+            tuple(filter_fields),
+            session.get_bind(self._model).dialect,
+        )
+
+        def key_of(obj: dict[str, Any]) -> tuple:
+            return tuple(
+                obj.get(field) if process is None else process(obj.get(field))
+                for field, process in zip(filter_fields, processors)
+            )
+
+        def model_key(db_obj: ModelType) -> tuple:
+            return tuple(getattr(db_obj, field) for field in filter_fields)
+
+        found: dict[tuple, ModelType] = {}
+        rows = dedupe_by_keys(objs, filter_fields)
+        for keys, group in group_by_keys(rows).items():
+            for chunk in chunk_rows(group, len(keys)):
+                stmt = (
+                    pg_insert(self._model)
+                    .values(chunk)
+                    .on_conflict_do_nothing(index_elements=filter_fields)
+                    .returning(self._model)
+                )
+                for db_obj in await session.scalars(stmt):
+                    found[model_key(db_obj)] = db_obj
+
+        missing = [key_of(row) for row in rows]
+        if not self._has_custom_base:
+            missing = [key for key in missing if key not in found]
+        for chunk in chunk_rows(missing, len(filter_fields)):
+            existing = await self.get_multi_raw(
+                session,
+                operator_expressions=[self._keys_filter(filter_fields, chunk)],
+            )
+            for db_obj in existing:
+                found[model_key(db_obj)] = db_obj
+        observe_inserted(session, self._model, found.values())
+        return [found[key_of(obj)] for obj in objs]
+
+    @timed
     async def bump_last_modified(
         self, session: AsyncSession, *, row_filter
     ) -> int:
+        """With write behind and a primary key filter the bump is
+        queued, 0 rows are reported, it is written by the next flush
+        outside of `session`"""
+
+        if self._write_behind is not None:
+            pk = self._primary_key_of(row_filter)
+            if pk is not None:
+                await self._write_behind.put(pk)
+                return 0
         return await self.update(
             session, update_filter=row_filter, update_values={}
         )
 
+    @timed
+    async def update_later(
+        self, pk: dict[str, Any], update_values: dict[str, Any]
+    ) -> None:
+        """Queue a small patch of one row by primary key, later patches
+        of the row win; written at once without write behind"""
+
+        if self._write_behind is not None:
+            await self._write_behind.put(pk, update_values)
+            return
+        if self._primary_key_of(pk) is None:
+            raise ValueError("pk must hold every primary key column")
+        async with async_session() as session, session.begin():
+            await self.update(
+                session, update_filter=pk, update_values=update_values
+            )
+
+    @property
+    def write_behind_stats(self) -> dict[str, int] | None:
+        if self._write_behind is None:
+            return None
+        return self._write_behind.stats
+
+    @timed
+    @write_operation
     async def delete(
         self,
         session: AsyncSession,
@@ -346,5 +1203,6 @@ class CRUDBase(Generic[ModelType, GetSchemaType, CreateSchemaType]):
             stmt = stmt.where(*operator_expressions)
 
         result: CursorResult = await session.execute(stmt)
+        invalidate_bounds(session, self._model)
         await session.flush()
         return result.rowcount
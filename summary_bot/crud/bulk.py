@@ -0,0 +1,141 @@
+from collections.abc import Iterable, Iterator
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+from sqlalchemy import cast, column, inspect, select, tuple_, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Update
+
+
+T = TypeVar("T")
+
+# asyncpg sends bind parameter count as int16
+PG_MAX_PARAMS = 32767
+
+VALUES_ALIAS = "x_values"
+
+
+def dump_obj(
+    obj_in: dict | BaseModel,
+    exclude_none: bool = True,
+    exclude_unset: bool = False,
+) -> dict:
+    if isinstance(obj_in, BaseModel):
+        return obj_in.model_dump(
+            exclude_none=exclude_none, exclude_unset=exclude_unset
+        )
+    return obj_in
+
+
+def group_by_keys(
+    rows: Iterable[dict[str, Any]],
+) -> dict[tuple[str, ...], list[dict[str, Any]]]:
+    """rows with the same key set can share one multi VALUES statement"""
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return groups
+
+
+def chunk_rows(
+    rows: list[T],
+    params_per_row: int,
+    max_rows: int | None = None,
+) -> Iterator[list[T]]:
+    size = max(1, PG_MAX_PARAMS // max(1, params_per_row))
+    if max_rows is not None:
+        size = min(size, max_rows)
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def primary_key_names(model: type) -> tuple[str, ...]:
+    mapper = inspect(model)
+    return tuple(
+        mapper.get_property_by_column(c).key for c in mapper.primary_key
+    )
+
+
+def update_by_primary_key(
+    model: type, keys: tuple[str, ...], rows: list[dict[str, Any]]
+) -> Update:
+    """One UPDATE ... FROM (VALUES ...) setting `keys` of every row
+    found by its primary key; without keys only the onupdate columns
+    of `pk IN (...)` are set"""
+
+    mapper = inspect(model)
+    pk_columns = mapper.primary_key
+    pk_keys = primary_key_names(model)
+    if not keys:
+        identities = [tuple(row[key] for key in pk_keys) for row in rows]
+        if len(pk_columns) == 1:
+            where = pk_columns[0].in_([identity[0] for identity in identities])
+        else:
+            where = tuple_(*pk_columns).in_(identities)
+        return update(model).where(where)
+
+    all_keys = (*pk_keys, *keys)
+    columns = [mapper.columns[key] for key in all_keys]
+    data = values(
+        *(column(c.name, c.type) for c in columns), name=VALUES_ALIAS
+    ).data([tuple(row[key] for key in all_keys) for row in rows])
+    return (
+        update(model)
+        .where(*(c == data.c[c.name] for c in pk_columns))
+        # a column of NULLs only is text in VALUES
+        .values(
+            {c: cast(data.c[c.name], c.type) for c in columns[len(pk_keys):]}
+        )
+    )
+
+
+def dedupe_by_keys(
+    rows: Iterable[dict[str, Any]], keys: list[str]
+) -> list[dict[str, Any]]:
+    """the last row wins, postgres refuses to touch one row twice
+    within a single ON CONFLICT statement"""
+
+    result = {}
+    for row in rows:
+        result[tuple(row.get(key) for key in keys)] = row
+    return list(result.values())
+
+
+def merge_by_keys(
+    rows: Iterable[dict[str, Any]], keys: list[str]
+) -> list[dict[str, Any]]:
+    """rows of the same key in one, the later values win"""
+
+    result = {}
+    for row in rows:
+        key = tuple(row.get(key) for key in keys)
+        if key in result:
+            result[key] = {**result[key], **row}
+        else:
+            result[key] = row
+    return list(result.values())
+
+
+async def refresh_expired(session: AsyncSession, models: list) -> None:
+    """Reload expired models with one SELECT per model class
+    instead of a `session.refresh` per object"""
+
+    expired = {}
+    for model in models:
+        if inspect(model).expired_attributes:
+            expired.setdefault(type(model), []).append(model)
+    for model_cls, group in expired.items():
+        columns = inspect(model_cls).primary_key
+        identities = [inspect(model).identity for model in group]
+        for chunk in chunk_rows(identities, len(columns)):
+            if len(columns) == 1:
+                where = columns[0].in_([identity[0] for identity in chunk])
+            else:
+                where = tuple_(*columns).in_(chunk)
+            stmt = (
+                select(model_cls)
+                .where(where)
+                .execution_options(populate_existing=True)
+            )
+            (await session.scalars(stmt)).all()
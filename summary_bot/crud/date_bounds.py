@@ -0,0 +1,238 @@
+import operator
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+from typing import Any
+
+from sqlalchemy import BinaryExpression, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapper, Session, object_session
+from sqlalchemy.sql.elements import BindParameter, Null
+
+from summary_bot.models.base import BoundDbModel
+
+
+MISSING = object()
+_SESSION_INFO_KEY = "x_date_bounds_rows"
+
+
+def _equality_matcher(model: type, filters: list) -> dict[str, Any] | None:
+    """{attribute: value} if every filter is `column == value`
+    or `column IS NULL`, so a new row can be matched in python"""
+
+    matcher = {}
+    mapper = inspect(model)
+    for filter_ in filters:
+        if filter_ is True:
+            continue
+        if not isinstance(filter_, BinaryExpression):
+            return None
+        if filter_.operator not in (operator.eq, operator.is_):
+            return None
+        right = filter_.right
+        if isinstance(right, Null):
+            value = None
+        elif isinstance(right, BindParameter):
+            value = right.effective_value
+        else:
+            return None
+        try:
+            attribute = mapper.get_property_by_column(filter_.left).key
+        except Exception:
+            return None
+        matcher[attribute] = value
+    return matcher
+
+
+def filters_key(model: type, filters: list) -> Hashable | None:
+    """None if the filter set can not be a cache key"""
+
+    matcher = _equality_matcher(model, filters)
+    try:
+        if matcher is not None:
+            key = (model, frozenset(matcher.items()))
+        else:
+            cache_keys = [f._generate_cache_key() for f in filters]
+            key = (
+                model,
+                tuple(k.key for k in cache_keys),
+                tuple(
+                    bind.effective_value
+                    for k in cache_keys
+                    for bind in k.bindparams
+                ),
+            )
+        hash(key)
+    except (TypeError, AttributeError):
+        return None
+    return key
+
+
+class _Entry:
+    __slots__ = ("expires", "matcher", "min_date", "max_date")
+
+    def __init__(self, expires, matcher, min_date, max_date):
+        self.expires = expires
+        self.matcher = matcher
+        self.min_date = min_date
+        self.max_date = max_date
+
+
+class DateBoundsCache:
+    """min/max of `bound_date_column` per (model, filters).
+    Committed inserts widen the cached bounds instead of dropping them,
+    updates of the column and deletes drop the model entries."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self._maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> tuple[Any, Any] | object:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires < time.monotonic():
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry.min_date, entry.max_date
+
+    def set(
+        self, key: Hashable, filters: list, min_date: Any, max_date: Any
+    ) -> None:
+        self._entries[key] = _Entry(
+            time.monotonic() + self.ttl,
+            _equality_matcher(key[0], filters),
+            min_date,
+            max_date,
+        )
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, model: type) -> None:
+        for key in [key for key in self._entries if key[0] is model]:
+            del self._entries[key]
+
+    def observe(self, model: type, rows: Iterable[dict[str, Any]]) -> None:
+        date_key = model.bound_date_column().key
+        for row in rows:
+            date = row.get(date_key, MISSING)
+            for key in [key for key in self._entries if key[0] is model]:
+                if not self._widen(self._entries[key], row, date):
+                    del self._entries[key]
+
+    @staticmethod
+    def _widen(entry: _Entry, row: dict[str, Any], date: Any) -> bool:
+        """False if the entry can not be kept up to date"""
+
+        if date is MISSING:
+            return False
+        if date is None:
+            return True
+        try:
+            if entry.min_date is not None and (
+                entry.min_date <= date <= entry.max_date
+            ):
+                return True
+            if entry.matcher is None:
+                return False
+            for attribute, value in entry.matcher.items():
+                if row.get(attribute, MISSING) != value:
+                    return True
+            if entry.min_date is None:
+                entry.min_date = entry.max_date = date
+            else:
+                entry.min_date = min(entry.min_date, date)
+                entry.max_date = max(entry.max_date, date)
+        except TypeError:
+            # e.g. naive and aware datetime
+            return False
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "size": len(self._entries),
+        }
+
+
+date_bounds_cache = DateBoundsCache()
+
+
+def _loaded_values(obj: Any) -> dict[str, Any]:
+    # without lazy loads, they are not possible inside flush events
+    return dict(inspect(obj).dict)
+
+
+def observe_inserted(
+    session: AsyncSession | Session, model: type, rows: Iterable[Any]
+) -> None:
+    """Remember inserted rows, the bounds are widened after commit"""
+
+    if not issubclass(model, BoundDbModel):
+        return
+    pending = session.info.setdefault(_SESSION_INFO_KEY, {})
+    pending.setdefault(model, []).extend(map(_loaded_values, rows))
+
+
+def invalidate_bounds(session: AsyncSession | Session, model: type) -> None:
+    if not issubclass(model, BoundDbModel):
+        return
+    date_bounds_cache.invalidate(model)
+    # and once again after commit, a concurrent read could cache old rows
+    pending = session.info.setdefault(_SESSION_INFO_KEY, {})
+    pending.setdefault(model, []).append(None)
+
+
+def has_pending(session: AsyncSession | Session, model: type) -> bool:
+    """the session sees its own uncommitted rows, the cache does not"""
+
+    return model in session.info.get(_SESSION_INFO_KEY, ())
+
+
+@event.listens_for(Mapper, "after_insert")
+def _after_insert(mapper, connection, target) -> None:
+    if isinstance(target, BoundDbModel):
+        observe_inserted(object_session(target), type(target), [target])
+
+
+@event.listens_for(Mapper, "after_update")
+def _after_update(mapper, connection, target) -> None:
+    if not isinstance(target, BoundDbModel):
+        return
+    date_key = type(target).bound_date_column().key
+    if inspect(target).attrs[date_key].history.has_changes():
+        invalidate_bounds(object_session(target), type(target))
+
+
+@event.listens_for(Mapper, "after_delete")
+def _after_delete(mapper, connection, target) -> None:
+    if isinstance(target, BoundDbModel):
+        invalidate_bounds(object_session(target), type(target))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session) -> None:
+    pending = session.info.pop(_SESSION_INFO_KEY, {})
+    for model, rows in pending.items():
+        if None in rows:
+            date_bounds_cache.invalidate(model)
+        else:
+            date_bounds_cache.observe(model, rows)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_after_rollback(session: Session, previous_transaction) -> None:
+    # rows of a rolled back savepoint can not be told apart
+    for model in session.info.pop(_SESSION_INFO_KEY, {}):
+        date_bounds_cache.invalidate(model)
@@ -0,0 +1,45 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) <statement> with the statement bind params"""
+
+    inherit_cache = False
+
+    def __init__(self, statement: Select):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(
+        element.statement, **kw
+    )
+
+
+RELTUPLES_QUERY = text(
+    "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)"
+)
+
+
+async def table_rows_estimate(
+    session: AsyncSession, table_name: str
+) -> int | None:
+    """planner statistics, None if the table was never analyzed"""
+
+    estimate = (
+        await session.execute(RELTUPLES_QUERY, {"name": table_name})
+    ).scalar()
+    if estimate is None or estimate < 0:
+        return None
+    return estimate
+
+
+async def plan_rows_estimate(session: AsyncSession, stmt: Select) -> int:
+    plan = (await session.execute(Explain(stmt))).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,254 @@
+"""Lookups of `**filter_dict`: "field" (or "field__eq") is compared with =,
+None with IS NULL; "field__in" with = ANY(:array); "field__range" takes
+(from, till), both included and either can be None; "field__prefix"
+goes to LIKE 'value%' and "field__is_null" to IS [NOT] NULL.
+The where clause of a model and a shape (fields, lookups and which of
+them are None) is built once with bind parameters, the values only go
+to the params, so the statement text depends neither on them nor on
+the length of an IN list. An attribute without a column type (e.g.
+a relationship) is not templated, it is compared with == as it is.
+`parse_filters` validates query parameters
+of an API against `filter_fields()` of the model."""
+
+from collections.abc import Mapping
+from functools import cache, lru_cache
+from typing import Any, NamedTuple, Optional
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import String, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql.elements import ColumnElement
+
+from summary_bot.utils.common import ComparisonType
+
+LOOKUP_SEP = "__"
+LIKE_ESCAPE = "\\"
+# where clauses of every model together
+WHERE_CACHE_SIZE = 1024
+
+
+class InvalidFilterEx(ValueError):
+    pass
+
+
+class Condition(NamedTuple):
+    field: str
+    comparison: ComparisonType
+    value: Any
+
+    @property
+    def shape(self) -> tuple:
+        """what the statement text depends on"""
+
+        variant = None
+        if self.comparison is ComparisonType.EQ:
+            variant = self.value is None
+        elif self.comparison is ComparisonType.RANGE:
+            low, high = self.value
+            variant = (low is not None, high is not None)
+        elif self.comparison is ComparisonType.IS_NULL:
+            variant = bool(self.value)
+        return self.field, self.comparison, variant
+
+
+def split_lookup(key: str) -> tuple[str, ComparisonType]:
+    field, sep, lookup = key.rpartition(LOOKUP_SEP)
+    if sep:
+        try:
+            return field, ComparisonType(lookup)
+        except ValueError:
+            pass
+    return key, ComparisonType.EQ
+
+
+def conditions(filter_dict: dict[str, Any]) -> list[Condition]:
+    return [
+        Condition(*split_lookup(key), value)
+        for key, value in filter_dict.items()
+    ]
+
+
+def filter_shape(filter_dict: dict[str, Any]) -> tuple:
+    return tuple(condition.shape for condition in conditions(filter_dict))
+
+
+def filter_param(field: str, suffix: str = "eq") -> str:
+    return f"{field}_{suffix}"
+
+
+def _bind(column: InstrumentedAttribute, name: str, type_=None):
+    return bindparam(name, type_=type_ if type_ is not None else column.type)
+
+
+def _clauses(
+    column: InstrumentedAttribute,
+    field: str,
+    comparison: ComparisonType,
+    variant: Any,
+) -> list[ColumnElement[bool]]:
+    match comparison:
+        case ComparisonType.EQ if variant:
+            return [column.is_(None)]
+        case ComparisonType.EQ:
+            return [column == _bind(column, filter_param(field))]
+        case ComparisonType.IN:
+            array = ARRAY(column.type)
+            values = _bind(column, filter_param(field, "in"), array)
+            return [column == any_(values)]
+        case ComparisonType.RANGE:
+            has_from, has_till = variant
+            result = []
+            if has_from:
+                low = _bind(column, filter_param(field, "from"))
+                result.append(column >= low)
+            if has_till:
+                high = _bind(column, filter_param(field, "till"))
+                result.append(column <= high)
+            return result
+        case ComparisonType.PREFIX:
+            # a btree serves it with the C collation or text_pattern_ops
+            prefix = _bind(column, filter_param(field, "prefix"), String())
+            return [column.like(prefix, escape=LIKE_ESCAPE)]
+        case ComparisonType.IS_NULL:
+            return [column.is_(None) if variant else column.is_not(None)]
+    raise InvalidFilterEx(f"Unknown comparison {comparison}")
+
+
+def _has_type(model: type, field: str) -> bool:
+    return hasattr(getattr(model, field), "type")
+
+
+@lru_cache(maxsize=WHERE_CACHE_SIZE)
+def is_templated(model: type, shape: tuple) -> bool:
+    """every field of the shape can be compared with a bind parameter"""
+
+    return all(_has_type(model, field) for field, _, _ in shape)
+
+
+@lru_cache(maxsize=WHERE_CACHE_SIZE)
+def bind_where(model: type, shape: tuple) -> tuple[ColumnElement[bool], ...]:
+    return tuple(
+        clause
+        for field, comparison, variant in shape
+        for clause in _clauses(
+            getattr(model, field), field, comparison, variant
+        )
+    )
+
+
+def escape_like(value: str) -> str:
+    for char in (LIKE_ESCAPE, "%", "_"):
+        value = value.replace(char, LIKE_ESCAPE + char)
+    return value
+
+
+def bind_values(filter_dict: dict[str, Any]) -> dict[str, Any]:
+    params = {}
+    for field, comparison, value in conditions(filter_dict):
+        if comparison is ComparisonType.EQ and value is not None:
+            params[filter_param(field)] = value
+        elif comparison is ComparisonType.IN:
+            params[filter_param(field, "in")] = list(value)
+        elif comparison is ComparisonType.RANGE:
+            low, high = value
+            if low is not None:
+                params[filter_param(field, "from")] = low
+            if high is not None:
+                params[filter_param(field, "till")] = high
+        elif comparison is ComparisonType.PREFIX:
+            params[filter_param(field, "prefix")] = escape_like(value) + "%"
+    return params
+
+
+def where_clause(
+    model: type, filter_dict: dict[str, Any]
+) -> list[ColumnElement[bool]]:
+    """the cached clauses with the values bound,
+    for the statements which are not templated"""
+
+    typed = {}
+    untyped = []
+    for field, comparison, value in conditions(filter_dict):
+        if _has_type(model, field):
+            typed[f"{field}{LOOKUP_SEP}{comparison.value}"] = value
+        elif comparison is ComparisonType.EQ:
+            untyped.append(getattr(model, field) == value)
+        else:
+            raise InvalidFilterEx(
+                f"{field} is not a column, only == is supported"
+            )
+    params = bind_values(typed)
+    where = bind_where(model, filter_shape(typed))
+    return [clause.params(params) for clause in where] + untyped
+
+
+def from_triples(
+    triples: list[tuple[InstrumentedAttribute, ComparisonType, Any]]
+) -> dict[str, Any]:
+    """`FilterType` triples to `**filter_dict`"""
+
+    return {
+        f"{column.key}{LOOKUP_SEP}{ComparisonType(comparison).value}": value
+        for column, comparison, value in triples
+    }
+
+
+def _value_type(model: type, field: str) -> Any:
+    custom = model.custom_field_comparison().get(field)
+    if custom is not None:
+        return custom
+    try:
+        return getattr(model, field).type.python_type
+    except NotImplementedError:
+        return Any
+
+
+@cache
+def _adapter(
+    model: type, field: str, comparison: ComparisonType
+) -> TypeAdapter:
+    value_type = Optional[_value_type(model, field)]
+    match comparison:
+        case ComparisonType.IN:
+            return TypeAdapter(list[_value_type(model, field)])
+        case ComparisonType.RANGE:
+            return TypeAdapter(tuple[value_type, value_type])
+        case ComparisonType.PREFIX:
+            return TypeAdapter(str)
+        case ComparisonType.IS_NULL:
+            return TypeAdapter(bool)
+    return TypeAdapter(value_type)
+
+
+def parse_filters(model: type, params: Mapping[str, Any]) -> dict[str, Any]:
+    """Validated `**filter_dict` of query parameters: the fields of
+    `model.filter_fields()` only, the values of the column python type
+    or of `custom_field_comparison()`. "in" and "range" values are
+    lists or comma separated strings, an empty range bound is None."""
+
+    allowed = set(model.filter_fields())
+    result = {}
+    for key, value in params.items():
+        field, comparison = split_lookup(key)
+        if field not in allowed:
+            raise InvalidFilterEx(
+                f"{field} is not in {model.__name__}.filter_fields()"
+            )
+        if comparison is ComparisonType.PREFIX and not isinstance(
+            getattr(model, field).type, String
+        ):
+            raise InvalidFilterEx(f"{field} is not a string column")
+        if isinstance(value, str) and comparison is ComparisonType.IN:
+            value = value.split(",") if value else []
+        elif isinstance(value, str) and comparison is ComparisonType.RANGE:
+            value = [bound or None for bound in value.split(",")]
+        try:
+            result[key] = _adapter(model, field, comparison).validate_python(
+                value
+            )
+        except ValidationError as error:
+            raise InvalidFilterEx(
+                f"{key}: {error.errors()[0]['msg']}"
+            ) from None
+    return result
@@ -0,0 +1,142 @@
+import base64
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from typing import Any, NamedTuple
+
+from sqlalchemy import and_, inspect, or_, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql.elements import ColumnElement, UnaryExpression
+
+from summary_bot.models import Base
+
+
+DESC_PREFIX = "desc_"
+
+
+class InvalidCursorEx(ValueError):
+    pass
+
+
+class OrderColumn(NamedTuple):
+    name: str
+    column: InstrumentedAttribute
+    desc: bool
+
+    @property
+    def expression(self) -> UnaryExpression:
+        return self.column.desc() if self.desc else self.column.asc()
+
+
+class KeysetPage(NamedTuple):
+    items: list
+    next_cursor: str | None
+
+
+def _encode_value(value: Any) -> Any:
+    match value:
+        case datetime.datetime():
+            return {"dt": value.isoformat()}
+        case datetime.date():
+            return {"d": value.isoformat()}
+        case uuid.UUID():
+            return {"uuid": str(value)}
+        case Decimal():
+            return {"dec": str(value)}
+        case _:
+            return value
+
+
+def _decode_value(value: Any) -> Any:
+    if not isinstance(value, dict):
+        return value
+    match value:
+        case {"dt": str(raw)}:
+            return datetime.datetime.fromisoformat(raw)
+        case {"d": str(raw)}:
+            return datetime.date.fromisoformat(raw)
+        case {"uuid": str(raw)}:
+            return uuid.UUID(raw)
+        case {"dec": str(raw)}:
+            return Decimal(raw)
+    raise InvalidCursorEx(f"Unknown cursor value {value}")
+
+
+def parse_order_fields(
+    model: type[Base], order_fields: list[str] | None = None
+) -> list[OrderColumn]:
+    """Resolve names like "desc_created_at" to model columns
+    and append primary key columns as a stable tie-breaker"""
+
+    if order_fields is None:
+        order_fields = model.default_order_fields()
+    allowed = set(model.order_fields())
+    result = []
+    for field in order_fields:
+        desc = field.startswith(DESC_PREFIX)
+        name = field[len(DESC_PREFIX):] if desc else field
+        if name not in allowed:
+            raise ValueError(
+                f"{name} is not in {model.__name__}.order_fields()"
+            )
+        result.append(OrderColumn(name, getattr(model, name), desc))
+
+    used = {order.name for order in result}
+    # the pk follows the direction of the last explicit field
+    pk_desc = result[-1].desc if result else False
+    for pk in inspect(model).primary_key:
+        if pk.key not in used:
+            result.append(OrderColumn(pk.key, getattr(model, pk.key), pk_desc))
+    return result
+
+
+def _fingerprint(order: list[OrderColumn]) -> str:
+    return ",".join(
+        f"{DESC_PREFIX if o.desc else ''}{o.name}" for o in order
+    )
+
+
+def encode_cursor(order: list[OrderColumn], row: Any) -> str:
+    payload = {
+        "o": _fingerprint(order),
+        "v": [_encode_value(getattr(row, o.name)) for o in order],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(order: list[OrderColumn], cursor: str) -> list[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        fingerprint, values = payload["o"], payload["v"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursorEx(f"Malformed cursor {cursor!r}") from e
+    if fingerprint != _fingerprint(order) or len(values) != len(order):
+        raise InvalidCursorEx("Cursor was issued for another ordering")
+    return [_decode_value(value) for value in values]
+
+
+def seek_expression(
+    order: list[OrderColumn], values: list[Any]
+) -> ColumnElement[bool]:
+    """WHERE clause for rows strictly after `values` in `order`.
+    A uniform direction is rendered as a row comparison
+    `(a, b) < (:a, :b)` that postgres can match to a composite index"""
+
+    if len({o.desc for o in order}) == 1:
+        left = tuple_(*(o.column for o in order))
+        right = tuple_(*values)
+        return left < right if order[0].desc else left > right
+
+    clauses = []
+    for index, current in enumerate(order):
+        equals = [o.column == v for o, v in zip(order[:index], values)]
+        value = values[index]
+        if current.desc:
+            after = current.column < value
+        else:
+            after = current.column > value
+        clauses.append(and_(*equals, after))
+    return or_(*clauses)
@@ -0,0 +1,131 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ClauseElement, UnaryExpression
+
+from summary_bot.crud.statement_cache import order_key
+
+
+MISSING = object()
+# models written in the session, their caches are cleared after commit
+_SESSION_INFO_KEY = "x_result_cache_models"
+
+
+class ResultCache:
+    """LRU with a size bound and time to live of every entry"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "size": len(self._entries),
+        }
+
+
+_model_caches: dict[type, list[ResultCache]] = {}
+
+
+def register_cache(model: type, cache: ResultCache) -> None:
+    caches = _model_caches.setdefault(model, [])
+    if not any(registered is cache for registered in caches):
+        caches.append(cache)
+
+
+def clear_model_caches(model: type) -> None:
+    for cache in _model_caches.get(model, ()):
+        cache.clear()
+
+
+def invalidate_model(session: AsyncSession | Session, model: type) -> None:
+    """Clear now for reads in the same transaction and once again
+    after commit, a concurrent read could cache the old rows between"""
+
+    if model not in _model_caches:
+        return
+    clear_model_caches(model)
+    session.info.setdefault(_SESSION_INFO_KEY, set()).add(model)
+
+
+def is_written(session: AsyncSession | Session, model: type) -> bool:
+    """uncommitted rows of the session must not get into the cache"""
+
+    return model in session.info.get(_SESSION_INFO_KEY, ())
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_after_commit(session: Session) -> None:
+    for model in session.info.pop(_SESSION_INFO_KEY, ()):
+        clear_model_caches(model)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    # nothing of the session is left to keep out of the cache
+    session.info.pop(_SESSION_INFO_KEY, None)
+
+
+def _key_part(value: Any) -> Hashable:
+    if isinstance(value, UnaryExpression):
+        key = order_key(value)
+    elif isinstance(value, (ClauseElement, list)):
+        # arbitrary expressions are not a stable key
+        key = None
+    else:
+        key = value
+    if key is None and value is not None:
+        raise TypeError(value)
+    return key
+
+
+def result_key(
+    name: str, args: tuple, kwargs: dict[str, Any]
+) -> Hashable | None:
+    """None if the call can not be cached"""
+
+    try:
+        key = (
+            name,
+            tuple(_key_part(value) for value in args),
+            tuple(
+                sorted((k, _key_part(v)) for k, v in kwargs.items())
+            ),
+        )
+        hash(key)
+    except TypeError:
+        return None
+    return key
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from sqlalchemy.sql.elements import ClauseElement, UnaryExpression
+
+
+OFFSET_PARAM = "x_offset"
+LIMIT_PARAM = "x_limit"
+
+
+class StatementCache:
+    """LRU of statements built with bind parameters instead of values,
+    so the same shape is constructed once and hits the SQLAlchemy
+    compiled cache and asyncpg prepared statements with the same key"""
+
+    def __init__(self, maxsize: int = 256):
+        self._maxsize = maxsize
+        self._statements: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        try:
+            statement = self._statements[key]
+        except KeyError:
+            self.misses += 1
+            statement = self._statements[key] = factory()
+            if len(self._statements) > self._maxsize:
+                self._statements.popitem(last=False)
+            return statement
+        self.hits += 1
+        self._statements.move_to_end(key)
+        return statement
+
+    def clear(self) -> None:
+        self._statements.clear()
+        self.hits = self.misses = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._statements),
+        }
+
+
+def order_key(order_by: UnaryExpression | None) -> Hashable | None:
+    """None if the ordering can not be a part of a cache key"""
+
+    if order_by is None:
+        return ()
+    if not isinstance(order_by, ClauseElement):
+        # a column name, the statement is built without the template
+        return None
+    cache_key = order_by._generate_cache_key()
+    if cache_key is None or cache_key.bindparams:
+        # the template would keep bound values of the first ordering
+        return None
+    return cache_key.key
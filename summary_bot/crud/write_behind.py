@@ -0,0 +1,187 @@
+import asyncio
+from collections.abc import Callable
+from contextlib import suppress
+from typing import Any
+
+import loguru
+from sqlalchemy import inspect
+from sqlalchemy.engine.cursor import CursorResult
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from summary_bot.crud.bulk import (
+    chunk_rows,
+    group_by_keys,
+    primary_key_names,
+    update_by_primary_key,
+)
+from summary_bot.db import async_session
+
+# network and connection errors, the batch is kept for the next flush
+_TRANSIENT_ERRORS = (OSError, OperationalError, InterfaceError)
+
+_buffers: list["WriteBehindBuffer"] = []
+
+
+class WriteBehindBuffer:
+    """Pending updates of one model coalesced by primary key, the last
+    value of a column wins. Every `window` seconds they are written by
+    one UPDATE ... FROM (VALUES ...) per set of patched columns, so
+    a row bumped many times within the window is written once.
+    An empty patch only bumps the onupdate columns (last_modified),
+    their value is the time of the flush, not of the call."""
+
+    def __init__(
+        self,
+        model: type,
+        window: float,
+        max_pending: int,
+        session_factory: async_sessionmaker | None = None,
+        after_flush: Callable[[AsyncSession, tuple[str, ...]], None]
+        | None = None,
+    ):
+        self._model = model
+        self._pk_keys = primary_key_names(model)
+        self._can_bump = any(
+            c.onupdate is not None for c in inspect(model).columns
+        )
+        self.window = window
+        self.max_pending = max_pending
+        self._session_factory = session_factory
+        self._after_flush = after_flush
+        self._pending: dict[tuple, dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.queued = 0
+        self.coalesced = 0
+        self.written = 0
+        _buffers.append(self)
+
+    def _identity(self, pk: Any) -> tuple:
+        if isinstance(pk, dict):
+            return tuple(pk[key] for key in self._pk_keys)
+        if isinstance(pk, tuple):
+            return pk
+        return (pk,)
+
+    async def put(self, pk: Any, patch: dict[str, Any] | None = None) -> None:
+        """Queue a patch of the row, waits for a flush while the buffer
+        holds `max_pending` rows (backpressure)"""
+
+        patch = patch or {}
+        if not patch and not self._can_bump:
+            raise ValueError(
+                f"{self._model.__name__} has no onupdate column to bump"
+            )
+        if any(key in self._pk_keys for key in patch):
+            raise ValueError("primary key can not be patched")
+        identity = self._identity(pk)
+        while (
+            identity not in self._pending
+            and len(self._pending) >= self.max_pending
+        ):
+            await self.flush()
+        self.queued += 1
+        if (pending := self._pending.get(identity)) is not None:
+            self.coalesced += 1
+            pending.update(patch)
+        else:
+            self._pending[identity] = dict(patch)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(
+                self._flush_periodically()
+            )
+
+    async def _flush_periodically(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.window)
+            try:
+                await self.flush()
+            except Exception:
+                loguru.logger.exception(
+                    f"Write behind flush of {self._model.__name__} failed"
+                )
+
+    def _session(self) -> AsyncSession:
+        return (self._session_factory or async_session)()
+
+    async def flush(self) -> int:
+        """Write the pending rows now, the number of updated rows"""
+
+        async with self._lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                updated = await self._write(batch)
+            except _TRANSIENT_ERRORS:
+                self._requeue(batch)
+                raise
+            except Exception:
+                loguru.logger.error(
+                    f"Dropped {len(batch)} write behind rows"
+                    f" of {self._model.__name__}"
+                )
+                raise
+            except BaseException:
+                # cancelled in the middle, the transaction is rolled back
+                self._requeue(batch)
+                raise
+        self.written += updated
+        return updated
+
+    def _requeue(self, batch: dict[tuple, dict[str, Any]]) -> None:
+        # newer patches queued meanwhile win over the failed ones
+        for identity, patch in batch.items():
+            self._pending[identity] = {
+                **patch,
+                **self._pending.get(identity, {}),
+            }
+
+    async def _write(self, batch: dict[tuple, dict[str, Any]]) -> int:
+        rows = [
+            {**patch, **dict(zip(self._pk_keys, identity))}
+            for identity, patch in batch.items()
+        ]
+        updated = 0
+        async with self._session() as session, session.begin():
+            for keys, group in group_by_keys(rows).items():
+                keys = tuple(k for k in keys if k not in self._pk_keys)
+                for chunk in chunk_rows(group, len(self._pk_keys) + len(keys)):
+                    stmt = update_by_primary_key(self._model, keys, chunk)
+                    result: CursorResult = await session.execute(
+                        stmt.execution_options(synchronize_session=False)
+                    )
+                    updated += result.rowcount
+                if self._after_flush is not None:
+                    self._after_flush(session, keys)
+        return updated
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            # the periodic task is cancelled between flushes only
+            async with self._lock:
+                task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        await self.flush()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "written": self.written,
+        }
+
+
+async def flush_all() -> None:
+    """on shutdown, before the engines are disposed"""
+
+    for buffer in _buffers:
+        try:
+            await buffer.close()
+        except Exception:
+            loguru.logger.exception("Write behind flush on shutdown failed")
@@ -1,19 +1,247 @@
+import asyncio
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from itertools import cycle
+
+import loguru
+
+from sqlalchemy import Delete, Insert, Select, Update, event
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
 )
+from sqlalchemy.orm import Session
 
-from summary_bot.config import get_settings
-
-engine = create_async_engine(
-    get_settings().db.db_url, future=True, echo=get_settings().debug
+from summary_bot.config import get_settings, Settings
+from summary_bot.metrics import (
+    instrument_engine,
+    register_pool_gauges,
 )
+
+_USE_PRIMARY = "x_use_primary"
+_REPLICA = "x_replica"
+_READ_ONLY = "x_read_only"
+# reads of a `primary_reads` block
+_PRIMARY_READS = "x_primary_reads"
+# the session has committed on the primary, it stays there
+_COMMITTED_ON_PRIMARY = "x_committed_on_primary"
+
+
+def _create_engine(url: str, settings: Settings) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        future=True,
+        **settings.db.engine_kwargs(settings.debug),
+    )
+
+
+# created on first use or by `init_engines` in the application lifespan,
+# never at import: alembic and scripts do not pay for it and a forked
+# worker does not inherit the pool of its parent
+_engine: AsyncEngine | None = None
+_replica_engines: list[AsyncEngine] = []
+_replicas: Iterator[AsyncEngine] | None = None
+
+
+def init_engines(settings: Settings | None = None) -> AsyncEngine:
+    global _engine, _replica_engines, _replicas
+
+    if _engine is not None:
+        return _engine
+    settings = settings or get_settings()
+    engine = _create_engine(settings.db.db_url, settings)
+    replica_engines = [
+        _create_engine(url, settings) for url in settings.db.replica_urls
+    ]
+    instrument_engine(engine, "primary")
+    for index, replica in enumerate(replica_engines):
+        instrument_engine(replica, f"replica{index}")
+    _engine, _replica_engines = engine, replica_engines
+    _replicas = cycle(replica_engines)
+    return engine
+
+
+def get_engine() -> AsyncEngine:
+    return _engine or init_engines()
+
+
+def get_replica_engines() -> list[AsyncEngine]:
+    if _engine is None:
+        init_engines()
+    return _replica_engines
+
+
+def _created_engines() -> list[AsyncEngine]:
+    return [_engine, *_replica_engines] if _engine is not None else []
+
+
+async def dispose_engines(drain_timeout: float = 0) -> None:
+    """Close the pools, the next use creates new engines.
+    Waits up to `drain_timeout` seconds for checked out connections,
+    the ones still in use are closed when they are returned."""
+
+    global _engine, _replica_engines, _replicas
+
+    engines = _created_engines()
+    deadline = time.monotonic() + drain_timeout
+    while (
+        checked_out := sum(engine.pool.checkedout() for engine in engines)
+    ) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    if checked_out:
+        loguru.logger.warning(
+            f"Disposing engines with {checked_out} connections in use"
+        )
+    _engine, _replica_engines, _replicas = None, [], None
+    for engine in engines:
+        await engine.dispose()
+
+
+def _forget_engines_after_fork() -> None:
+    # connections of the parent must not be shared, they are left
+    # to the parent and the child creates its own engines
+    global _engine, _replica_engines, _replicas
+
+    for engine in _created_engines():
+        engine.sync_engine.dispose(close=False)
+    _engine, _replica_engines, _replicas = None, [], None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_engines_after_fork)
+
+
+def __getattr__(name: str):
+    # `from summary_bot.db import engine` keeps working
+    if name == "engine":
+        return get_engine()
+    if name == "replica_engines":
+        return get_replica_engines()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _is_read(clause) -> bool:
+    if isinstance(clause, Select):
+        return clause._for_update_arg is None
+    # text, explain and everything unknown stays on the primary
+    return False
+
+
+class RoutingSession(Session):
+    """Plain SELECTs go to a replica, everything else and the flush
+    go to the primary. After the first write the session stays on
+    the primary, so it reads its own writes even after commit."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not (replica_engines := get_replica_engines()):
+            if self.bind is not None:
+                return super().get_bind(mapper, clause=clause, **kw)
+            return get_engine().sync_engine
+
+        if self.info.get(_PRIMARY_READS):
+            return get_engine().sync_engine
+        read_only = self.info.get(_READ_ONLY, False)
+        if not read_only and (self._flushing or not _is_read(clause)):
+            if isinstance(clause, (Insert, Update, Delete)) or self._flushing:
+                self.info[_USE_PRIMARY] = True
+            return get_engine().sync_engine
+        if self.info.get(_USE_PRIMARY) and not read_only:
+            return get_engine().sync_engine
+
+        # one replica per session for monotonic reads
+        replica = self.info.get(_REPLICA)
+        if replica is None or replica not in replica_engines:
+            replica = self.info[_REPLICA] = next(_replicas)
+        return replica.sync_engine
+
+
+def use_primary(session: AsyncSession | Session) -> None:
+    """read-your-writes: all next statements of the session
+    (including ones after commit) go to the primary, until
+    a rollback while nothing has been committed yet"""
+
+    session.info[_USE_PRIMARY] = True
+
+
+@contextmanager
+def primary_reads(session: AsyncSession | Session) -> Iterator[None]:
+    """the reads within go to the primary, then the session
+    is routed as before, e.g. for results kept in a cache"""
+
+    session.info[_PRIMARY_READS] = session.info.get(_PRIMARY_READS, 0) + 1
+    try:
+        yield
+    finally:
+        session.info[_PRIMARY_READS] -= 1
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _stay_on_primary(session: Session) -> None:
+    if session.info.get(_USE_PRIMARY):
+        session.info[_COMMITTED_ON_PRIMARY] = True
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _leave_primary(session: Session) -> None:
+    # the rolled back writes are not there to read
+    if not session.info.get(_COMMITTED_ON_PRIMARY):
+        session.info.pop(_USE_PRIMARY, None)
+
+
+# no bind, RoutingSession picks the engine of every statement
 async_session = async_sessionmaker(
-    engine, expire_on_commit=False, class_=AsyncSession
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+)
+replica_session = async_sessionmaker(
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    info={_READ_ONLY: True},
 )
 
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+
+async def get_replica_session() -> AsyncSession:
+    """for read only endpoints, the primary if there are no replicas"""
+
+    async with replica_session() as session:
+        yield session
+
+
+def pool_status(engine: AsyncEngine | None = None) -> dict[str, int]:
+    """checked out, idle and overflow connections of the QueuePool"""
+
+    pool = (engine or get_engine()).pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+def engines() -> dict[str, AsyncEngine]:
+    """created engines only, a metrics scrape does not create them"""
+
+    if _engine is None:
+        return {}
+    return {
+        "primary": _engine,
+        **{
+            f"replica{index}": replica
+            for index, replica in enumerate(_replica_engines)
+        },
+    }
+
+
+register_pool_gauges(engines, pool_status)
@@ -0,0 +1,301 @@
+"""Btree indexes for the queries the models declare: `filter_fields()`
+equality filters followed by the `default_order_fields()` order, and
+every other `order_fields()` order with the primary key tie-breaker
+(as `crud.keyset.parse_order_fields` builds them). The proposals the
+live schema does not serve yet are printed as an alembic migration
+with CREATE INDEX CONCURRENTLY.
+
+    python -m summary_bot.indexes [--table mats_sms]
+    python -m summary_bot.indexes --unused
+"""
+
+import argparse
+import asyncio
+import hashlib
+import sys
+from typing import NamedTuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from summary_bot.crud.keyset import OrderColumn, parse_order_fields
+from summary_bot.db import dispose_engines, init_engines
+from summary_bot.models import Base, load_models
+from summary_bot.models.base import BoundDbModel
+
+# postgres truncates longer identifiers
+MAX_NAME_LENGTH = 63
+
+
+class IndexColumn(NamedTuple):
+    name: str
+    desc: bool = False
+
+    def render(self) -> str:
+        return f"{self.name} DESC" if self.desc else self.name
+
+
+class IndexProposal(NamedTuple):
+    table: str
+    columns: tuple[IndexColumn, ...]
+    include: tuple[str, ...] = ()
+    # CONCURRENTLY is not supported on a partitioned table
+    partitioned: bool = False
+
+    @property
+    def name(self) -> str:
+        name = f"ix_{self.table}_{'_'.join(c.name for c in self.columns)}"
+        if len(name) <= MAX_NAME_LENGTH:
+            return name
+        digest = hashlib.sha1(name.encode()).hexdigest()[:8]
+        return f"{name[:MAX_NAME_LENGTH - 9]}_{digest}"
+
+
+class UnusedIndex(NamedTuple):
+    table: str
+    name: str
+    size: int
+    scans: int
+
+
+def _key(columns: tuple[IndexColumn, ...]) -> tuple[IndexColumn, ...]:
+    # a btree is read backwards as well, the first column goes ascending
+    if columns and columns[0].desc:
+        return tuple(IndexColumn(c.name, not c.desc) for c in columns)
+    return columns
+
+
+def _serves(index: tuple[IndexColumn, ...], wanted) -> bool:
+    """a btree on `index` serves a query needing the `wanted` prefix"""
+
+    return _key(index[: len(wanted)]) == _key(wanted)
+
+
+def _order_columns(model: type[Base], order: list[OrderColumn]):
+    columns = inspect(model).columns
+    return tuple(IndexColumn(columns[o.name].name, o.desc) for o in order)
+
+
+def _order_lists(model: type[Base]) -> list[list[str] | None]:
+    try:
+        fields = model.order_fields()
+    except NotImplementedError:
+        return []
+    return [None, *([field] for field in fields)]
+
+
+def propose(model: type[Base]) -> list[IndexProposal]:
+    """indexes for the declared filters and orders of a model,
+    without the ones another proposal or the primary key serves"""
+
+    table = model.__table__
+    columns = inspect(model).columns
+    orders = []
+    for order_fields in _order_lists(model):
+        try:
+            orders.append(
+                _order_columns(model, parse_order_fields(model, order_fields))
+            )
+        except (NotImplementedError, ValueError):
+            continue
+    default_order = orders[0] if orders else ()
+
+    # in the rendered order, a serial goes first - (id, created_at)
+    primary_key = tuple(
+        IndexColumn(c.name) for c in table.primary_key.columns_autoinc_first
+    )
+    wanted = list(orders)
+    for field in model.filter_fields():
+        if field not in columns:
+            continue
+        name = columns[field].name
+        if not _serves(primary_key, (IndexColumn(name),)):
+            # any direction fits an equality, it follows the order
+            order = tuple(c for c in default_order if c.name != name)
+            desc = bool(order) and order[0].desc
+            wanted.append((IndexColumn(name, desc), *order))
+
+    include = ()
+    if issubclass(model, BoundDbModel):
+        include = (model.bound_date_column().name,)
+    result: list[IndexProposal] = []
+    for index_columns in sorted(map(_key, wanted), key=len, reverse=True):
+        if _serves(primary_key, index_columns) or any(
+            _serves(p.columns, index_columns) for p in result
+        ):
+            continue
+        names = {c.name for c in index_columns}
+        result.append(
+            IndexProposal(
+                table.name,
+                index_columns,
+                tuple(name for name in include if name not in names),
+                model.partition_interval() is not None,
+            )
+        )
+    return result
+
+
+async def existing_indexes(
+    conn: AsyncConnection, table: str
+) -> list[tuple[IndexColumn, ...]]:
+    """key columns of the live indexes, expression indexes are skipped"""
+
+    def reflect(sync_conn) -> list[tuple[IndexColumn, ...]]:
+        inspector = inspect(sync_conn)
+        result = []
+        pk = inspector.get_pk_constraint(table)["constrained_columns"]
+        if pk:
+            result.append(tuple(IndexColumn(name) for name in pk))
+        for index in inspector.get_indexes(table):
+            names = index["column_names"]
+            if any(name is None for name in names):
+                continue
+            sorting = index.get("column_sorting", {})
+            result.append(
+                tuple(
+                    IndexColumn(name, "desc" in sorting.get(name, ()))
+                    for name in names
+                )
+            )
+        return result
+
+    return await conn.run_sync(reflect)
+
+
+async def missing(
+    conn: AsyncConnection, proposals: list[IndexProposal]
+) -> list[IndexProposal]:
+    live: dict[str, list[tuple[IndexColumn, ...]]] = {}
+    result = []
+    for proposal in proposals:
+        if proposal.table not in live:
+            live[proposal.table] = await existing_indexes(
+                conn, proposal.table
+            )
+        if not any(
+            _serves(index, proposal.columns) for index in live[proposal.table]
+        ):
+            result.append(proposal)
+    return result
+
+
+def _create_op(proposal: IndexProposal) -> str:
+    columns = ", ".join(
+        f'sa.text("{c.render()}")' if c.desc else repr(c.name)
+        for c in proposal.columns
+    )
+    options = ""
+    if proposal.include:
+        options += f", postgresql_include={list(proposal.include)!r}"
+    if not proposal.partitioned:
+        options += ", postgresql_concurrently=True"
+    return (
+        f"op.create_index({proposal.name!r}, {proposal.table!r},"
+        f" [{columns}]{options})"
+    )
+
+
+def _drop_op(proposal: IndexProposal) -> str:
+    options = "" if proposal.partitioned else ", postgresql_concurrently=True"
+    return (
+        f"op.drop_index({proposal.name!r},"
+        f" table_name={proposal.table!r}{options})"
+    )
+
+
+def render_alembic(proposals: list[IndexProposal]) -> str:
+    """upgrade/downgrade of a migration, CONCURRENTLY needs to run
+    outside of the migration transaction"""
+
+    def block(ops: list[str]) -> str:
+        if not ops:
+            return "    pass\n"
+        body = "".join(f"        {op}\n" for op in ops)
+        return "    with op.get_context().autocommit_block():\n" + body
+
+    notes = "".join(
+        f"# {p.name}: {p.table} is partitioned, the index locks writes\n"
+        for p in proposals
+        if p.partitioned
+    )
+    return (
+        f"{notes}def upgrade() -> None:\n"
+        + block([_create_op(p) for p in proposals])
+        + "\n\ndef downgrade() -> None:\n"
+        + block([_drop_op(p) for p in reversed(proposals)])
+    )
+
+
+async def unused_indexes(
+    conn: AsyncConnection, tables: list[str]
+) -> list[UnusedIndex]:
+    """never scanned since the statistics reset on this server,
+    the ones behind a primary key or unique constraint are kept"""
+
+    rows = await conn.execute(
+        text(
+            "SELECT s.relname, s.indexrelname,"
+            " pg_relation_size(s.indexrelid), s.idx_scan"
+            " FROM pg_stat_user_indexes s"
+            " JOIN pg_index i ON i.indexrelid = s.indexrelid"
+            " WHERE s.idx_scan = 0 AND NOT i.indisunique"
+            " AND s.relname = ANY(:tables)"
+            " ORDER BY pg_relation_size(s.indexrelid) DESC"
+        ),
+        {"tables": tables},
+    )
+    return [UnusedIndex(*row) for row in rows]
+
+
+def models(tables: list[str] | None = None) -> list[type[Base]]:
+    return sorted(
+        (
+            model
+            for model in load_models().values()
+            if "__table__" in vars(model)
+            and (not tables or model.__tablename__ in tables)
+        ),
+        key=lambda model: model.__tablename__,
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m summary_bot.indexes")
+    parser.add_argument(
+        "--table", action="append", help="only these tables, repeatable"
+    )
+    parser.add_argument(
+        "--unused",
+        action="store_true",
+        help="indexes never scanned since the statistics reset",
+    )
+    return parser.parse_args(argv)
+
+
+async def _main(args: argparse.Namespace) -> int:
+    selected = models(args.table)
+    engine = init_engines()
+    try:
+        async with engine.connect() as conn:
+            if args.unused:
+                tables = [model.__tablename__ for model in selected]
+                for index in await unused_indexes(conn, tables):
+                    print(
+                        f"{index.table:<32} {index.name:<48}"
+                        f" {index.size // 1024} kB"
+                    )
+                return 0
+            proposals = [p for model in selected for p in propose(model)]
+            print(render_alembic(await missing(conn, proposals)), end="")
+    finally:
+        await dispose_engines()
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    return asyncio.run(_main(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
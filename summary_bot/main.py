@@ -0,0 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Response
+
+from summary_bot.config import get_settings
+from summary_bot.crud.write_behind import flush_all
+from summary_bot.db import dispose_engines, init_engines
+from summary_bot.metrics import (
+    CONTENT_TYPE,
+    read_snapshots,
+    registry,
+    write_periodically,
+    write_snapshot,
+)
+from summary_bot.retention import run_periodically
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # engines of this process, created after a fork of the worker
+    init_engines()
+    tasks = []
+    if (settings := get_settings().retention).enabled:
+        tasks.append(asyncio.create_task(run_periodically(settings)))
+    metrics_dir = _metrics_dir()
+    if metrics_dir is not None:
+        interval = get_settings().metrics.multiprocess_interval
+        tasks.append(
+            asyncio.create_task(write_periodically(metrics_dir, interval))
+        )
+    yield
+    for task in tasks:
+        # the retention batch in flight is rolled back
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # uvicorn has finished the requests in flight by now
+    await flush_all()
+    await dispose_engines(get_settings().db.pool_drain_timeout)
+    if metrics_dir is not None:
+        write_snapshot(metrics_dir)
+
+
+def _metrics_dir() -> str | None:
+    settings = get_settings().metrics
+    return settings.multiprocess_dir if settings.enabled else None
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+if get_settings().metrics.enabled:
+
+    @app.get(get_settings().metrics.path, include_in_schema=False)
+    async def metrics() -> Response:
+        others = None
+        if (metrics_dir := _metrics_dir()) is not None:
+            others = read_snapshots(metrics_dir)
+        return Response(registry.expose(others), media_type=CONTENT_TYPE)
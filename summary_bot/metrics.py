@@ -0,0 +1,446 @@
+"""Process local metrics in the Prometheus text format,
+no client library: histograms and counters are plain dicts.
+With several workers every process writes its series to
+`metrics.multiprocess_dir` and a scrape of any worker sums them up."""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from functools import wraps
+
+import loguru
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from summary_bot.config import get_settings
+
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)  # fmt: skip
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# the last label of the series over `max_series`
+OTHER_LABEL = "other"
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    )
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _bounded(series: dict, label_values: tuple, limit: int | None) -> tuple:
+    """label values of a new series, the last one is folded
+    into OTHER_LABEL once there are `limit` series"""
+
+    if limit is None or len(series) < limit:
+        return label_values
+    return (*label_values[:-1], OTHER_LABEL)
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labels: tuple[str, ...],
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        max_series: int | None = None,
+    ):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        self.max_series = max_series
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series: dict[tuple, list[float]] = {}
+
+    def observe(self, label_values: tuple, value: float) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            label_values = _bounded(
+                self._series, label_values, self.max_series
+            )
+            series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (
+                len(self.buckets) + 2
+            )
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def series(self) -> dict[tuple, list[float]]:
+        return self._series
+
+    def merged(self, others: dict[int, list]) -> dict[tuple, list[float]]:
+        """the series of this process with the ones of the others"""
+
+        result = {values: list(data) for values, data in self._series.items()}
+        for rows in others.values():
+            for values, data in rows:
+                current = result.setdefault(tuple(values), [0] * len(data))
+                for index, value in enumerate(data):
+                    current[index] += value
+        return result
+
+    def expose(self, all_series: dict | None = None) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.doc}",
+            f"# TYPE {self.name} histogram",
+        ]
+        if all_series is None:
+            all_series = self._series
+        for values, series in all_series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _labels(self.labels, values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += series[-2]
+            labels = _labels(self.labels, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labels: tuple[str, ...],
+        max_series: int | None = None,
+    ):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.max_series = max_series
+        self._series: dict[tuple, float] = {}
+
+    def inc(self, label_values: tuple, value: float = 1) -> None:
+        if label_values not in self._series:
+            label_values = _bounded(
+                self._series, label_values, self.max_series
+            )
+        self._series[label_values] = self._series.get(label_values, 0) + value
+
+    def series(self) -> dict[tuple, float]:
+        return self._series
+
+    def merged(self, others: dict[int, list]) -> dict[tuple, float]:
+        result = dict(self._series)
+        for rows in others.values():
+            for values, value in rows:
+                values = tuple(values)
+                result[values] = result.get(values, 0) + value
+        return result
+
+    def expose(self, series: dict | None = None) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.doc}",
+            f"# TYPE {self.name} counter",
+        ]
+        if series is None:
+            series = self._series
+        for values, value in series.items():
+            lines.append(
+                f"{self.name}{_labels(self.labels, values)} {value}"
+            )
+        return lines
+
+
+class Gauge:
+    """values are collected by the callback on every scrape"""
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labels: tuple[str, ...],
+        collect: Callable[[], dict[tuple, float]],
+    ):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.collect = collect
+
+    def series(self) -> dict[tuple, float]:
+        return self.collect()
+
+    def merged(self, others: dict[int, list]) -> dict[tuple, float]:
+        """values of every live process apart, the last label is pid"""
+
+        result = {
+            (*values, os.getpid()): value
+            for values, value in self.collect().items()
+        }
+        for pid, rows in others.items():
+            if _is_alive(pid):
+                for values, value in rows:
+                    result[(*values, pid)] = value
+        return result
+
+    def expose(self, series: dict | None = None) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.doc}",
+            f"# TYPE {self.name} gauge",
+        ]
+        labels = self.labels
+        if series is None:
+            series = self.collect()
+        else:
+            labels += ("pid",)
+        for values, value in series.items():
+            lines.append(f"{self.name}{_labels(labels, values)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Histogram | Counter | Gauge] = {}
+
+    def register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def snapshot(self) -> dict[str, list]:
+        """the series of this process, JSON ready"""
+
+        return {
+            name: [
+                [list(values), data]
+                for values, data in metric.series().items()
+            ]
+            for name, metric in self._metrics.items()
+        }
+
+    def expose(self, others: dict[int, dict[str, list]] | None = None) -> str:
+        """`others` - snapshots of the other processes by pid"""
+
+        lines = []
+        for name, metric in self._metrics.items():
+            if others is None:
+                lines.extend(metric.expose())
+            else:
+                lines.extend(
+                    metric.expose(
+                        metric.merged(
+                            {pid: s.get(name, []) for pid, s in others.items()}
+                        )
+                    )
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+# statement shapes of every engine together
+SQL_SERIES_LIMIT = 1000
+
+sql_latency = registry.register(
+    Histogram(
+        "summary_bot_sql_duration_seconds",
+        "SQL statement execution time by statement shape",
+        ("engine", "statement"),
+        max_series=SQL_SERIES_LIMIT,
+    )
+)
+sql_rows = registry.register(
+    Counter(
+        "summary_bot_sql_rows_total",
+        "Rows affected by DML statements by statement shape",
+        ("engine", "statement"),
+        max_series=SQL_SERIES_LIMIT,
+    )
+)
+slow_queries = registry.register(
+    Counter(
+        "summary_bot_sql_slow_total",
+        "Statements slower than the slow query threshold",
+        ("engine",),
+    )
+)
+crud_latency = registry.register(
+    Histogram(
+        "summary_bot_crud_duration_seconds",
+        "CRUD method time including schema mapping",
+        ("crud", "method"),
+    )
+)
+
+
+# statement text -> label, compiled statements are the same str objects
+_shapes: dict[str, str] = {}
+_SHAPES_LIMIT = 4096
+
+
+_SELECT_LIST = re.compile(r"\bSELECT (?:DISTINCT )?.*? FROM ")
+# a list of bind parameters: IN ($1, $2), VALUES ($1, $2), ($3, $4)
+_PARAMS = r"\$\d+(?:::[\w\[\] ]+?)?"
+_PARAM_LIST = re.compile(rf"\({_PARAMS}(?:, {_PARAMS})*\)")
+_REPEATED_LISTS = re.compile(r"\(…\)(?:, \(…\))+")
+
+
+def normalize_statement(statement: str) -> str:
+    """without the select lists and the lengths of parameter lists,
+    which make statements of one shape differ"""
+
+    normalized = " ".join(statement.split())
+    normalized = _SELECT_LIST.sub("SELECT … FROM ", normalized)
+    normalized = _PARAM_LIST.sub("(…)", normalized)
+    return _REPEATED_LISTS.sub("(…)", normalized)
+
+
+def statement_shape(statement: str) -> str:
+    shape = _shapes.get(statement)
+    if shape is None:
+        if len(_shapes) >= _SHAPES_LIMIT:
+            _shapes.clear()
+        length = get_settings().metrics.statement_label_length
+        shape = normalize_statement(statement)
+        if len(shape) > length:
+            # the cut ones stay apart by the digest of the whole shape
+            digest = hashlib.sha1(shape.encode()).hexdigest()[:8]
+            shape = f"{shape[:length - 9]} {digest}"
+        _shapes[statement] = shape
+    return shape
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """latency histogram, row counter and slow query log by hooks
+    around the DBAPI cursor execution"""
+
+    settings = get_settings().metrics
+    if not settings.enabled:
+        return
+    slow_threshold = settings.slow_query_threshold
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._x_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._x_started
+        labels = (name, statement_shape(statement))
+        sql_latency.observe(labels, elapsed)
+        rowcount = cursor.rowcount
+        if rowcount is not None and rowcount > 0:
+            sql_rows.inc(labels, rowcount)
+        if slow_threshold and elapsed >= slow_threshold:
+            slow_queries.inc((name,))
+            loguru.logger.warning(
+                f"Slow query {elapsed:.3f}s on {name}: {labels[1]}"
+            )
+
+
+def timed(func):
+    """CRUD method latency labeled by the CRUD subclass name"""
+
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            crud_latency.observe(
+                (type(self).__name__, func.__name__),
+                time.perf_counter() - started,
+            )
+
+    return wrapper
+
+
+def register_pool_gauges(
+    engines: Callable[[], dict[str, AsyncEngine]],
+    pool_status: Callable[[AsyncEngine], dict[str, int]],
+) -> None:
+    """`engines` returns {name: AsyncEngine} on scrape"""
+
+    def collect(field: str) -> Callable[[], dict[tuple, float]]:
+        return lambda: {
+            (name,): pool_status(engine)[field]
+            for name, engine in engines().items()
+        }
+
+    for field, doc in (
+        ("size", "Configured pool size"),
+        ("checked_out", "Connections in use"),
+        ("idle", "Connections idle in the pool"),
+        ("overflow", "Connections over the pool size"),
+    ):
+        name = f"summary_bot_db_pool_{field}"
+        registry.register(Gauge(name, doc, ("engine",), collect(field)))
+
+
+def _snapshot_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"{pid}.json")
+
+
+def write_snapshot(directory: str) -> None:
+    path = _snapshot_path(directory, os.getpid())
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(registry.snapshot(), file)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_snapshots(directory: str) -> dict[int, dict[str, list]]:
+    """snapshots of the other processes, the ones of the exited
+    workers too, so the counters do not go back"""
+
+    result = {}
+    for name in os.listdir(directory):
+        pid, _, suffix = name.partition(".")
+        if suffix != "json" or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                result[int(pid)] = json.load(file)
+        except (OSError, ValueError):
+            continue
+    return result
+
+
+def clear_snapshots(directory: str) -> None:
+    """before the workers start, series of a previous run would be
+    summed up with the new ones"""
+
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, name))
+
+
+async def write_periodically(directory: str, interval: float) -> None:
+    """background task of a worker, cancelled on shutdown"""
+
+    while True:
+        try:
+            write_snapshot(directory)
+        except OSError:
+            loguru.logger.exception("Metrics snapshot failed")
+        await asyncio.sleep(interval)
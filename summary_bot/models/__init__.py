@@ -1,12 +1,112 @@
-from .device import *  # noqa
-from .user_session import *  # noqa
-from .gateway import *  # noqa
-from .call import *  # noqa
-from .command import *  # noqa
-from .logs import *  # noqa
-from .profile import *  # noqa
-from .settings import *  # noqa
-from .sms import *  # noqa
-from .status import *  # noqa
-from .timetable import *  # noqa
-from .tasks_result import *  # noqa
+"""Model modules are imported on first use of an exported name
+(`from summary_bot.models import Device`), when the mappers are
+configured with a relationship target not registered yet, or by
+`load_models()` (alembic needs every table)."""
+
+import importlib
+from functools import cache
+from types import ModuleType
+
+import loguru
+from sqlalchemy import event
+from sqlalchemy.orm import Mapper, RelationshipProperty
+
+from .base import Base, class_registry  # noqa
+
+MODEL_MODULES = (
+    "device",
+    "user_session",
+    "gateway",
+    "call",
+    "command",
+    "logs",
+    "profile",
+    "settings",
+    "sms",
+    "status",
+    "timetable",
+    "tasks_result",
+)
+
+
+def _public_names(module: ModuleType) -> list[str]:
+    # the names `from module import *` gives
+    names = getattr(module, "__all__", None)
+    if names is None:
+        names = [name for name in vars(module) if not name.startswith("_")]
+    return names
+
+
+def _load_module(name: str) -> None:
+    module = importlib.import_module(f"{__name__}.{name}")
+    for public_name in _public_names(module):
+        globals()[public_name] = getattr(module, public_name)
+
+
+@cache
+def load_models() -> dict[str, type[Base]]:
+    """Import every model module, name -> model class"""
+
+    # later modules win, as with the star imports in this order
+    for name in MODEL_MODULES:
+        _load_module(name)
+    return {
+        name: model
+        for name, model in class_registry.items()
+        if isinstance(model, type) and issubclass(model, Base)
+    }
+
+
+def __getattr__(name: str):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    load_models()
+    try:
+        return globals()[name]
+    except KeyError:
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}"
+        ) from None
+
+
+def _unresolved_targets() -> set[str]:
+    """relationship targets named by a string, not registered yet"""
+
+    result = set()
+    for mapper in list(Base.registry.mappers):
+        if mapper.configured:
+            continue
+        for prop in mapper.iterate_properties:
+            if not isinstance(prop, RelationshipProperty):
+                continue
+            target = prop.argument
+            if (
+                isinstance(target, str)
+                and target.rpartition(".")[2] not in class_registry
+            ):
+                result.add(target)
+    return result
+
+
+@event.listens_for(Mapper, "before_configured")
+def _load_before_configure() -> None:
+    # relationships name their targets by strings of the registry,
+    # the modules are imported until every such target is there
+    if not (unresolved := _unresolved_targets()):
+        return
+    missing = []
+    for name in MODEL_MODULES:
+        try:
+            _load_module(name)
+        except ModuleNotFoundError as error:
+            if error.name != f"{__name__}.{name}":
+                raise
+            missing.append(error.name)
+            continue
+        if not (unresolved := _unresolved_targets()):
+            break
+    if missing:
+        loguru.logger.warning(
+            f"Model modules {', '.join(missing)} are missing,"
+            f" unresolved targets: {', '.join(sorted(unresolved)) or '-'}"
+        )
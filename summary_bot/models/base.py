@@ -1,16 +1,25 @@
 from abc import abstractmethod
 import datetime
-from typing import Any, Iterable
+import operator
+from collections.abc import Callable
+from functools import cache
+from typing import Any, ClassVar, Iterable, Literal
 import uuid
 from enum import IntEnum
-from pydantic import BaseModel, ConfigDict
 
 from sqlalchemy import (
+    and_,
     BigInteger,
     Column,
     DateTime,
+    Enum,
+    event,
     func,
+    Index,
+    inspect,
     Integer,
+    or_,
+    SmallInteger,
     TypeDecorator,
     Select,
     select,
@@ -18,6 +27,7 @@ from sqlalchemy import (
 from sqlalchemy.ext.declarative import as_declarative
 from sqlalchemy.orm import declared_attr, Mapped, mapped_column
 
+from summary_bot.models import codecs
 from summary_bot.utils.common import FilterType, camel_to_snake
 
 class_registry: dict = {}
@@ -25,6 +35,9 @@ class_registry: dict = {}
 MIN_DATE_SQL_LABEL = "x_min_date"
 MAX_DATE_SQL_LABEL = "x_max_date"
 
+PartitionInterval = Literal["day", "week", "month"]
+PARTITION_COLUMN = "created_at"
+
 
 @as_declarative(class_registry=class_registry)
 class Base:
@@ -36,6 +49,12 @@ class Base:
     def get_table_name(cls, model_name: str):
         return f"{cls.table_prefix()}_{camel_to_snake(model_name)}"
 
+    @classmethod
+    def partition_interval(cls) -> PartitionInterval | None:
+        """PostgreSQL range partitions of `created_at` per interval,
+        None - a plain table, see CreatedRangePartitionMixin"""
+        return None
+
     @classmethod
     def __generate_table_snake_name(cls):
         """StupidCAMelCase to stupid_ca_mel_case"""
@@ -52,6 +71,8 @@ class Base:
 
     @classmethod
     def custom_field_comparison(cls) -> dict[str, type]:
+        """value types of filter fields other than the column python type,
+        see `summary_bot.crud.filters.parse_filters`"""
         return {}
 
     @classmethod
@@ -62,32 +83,102 @@ class Base:
     def default_order_fields(cls) -> list[str]:
         raise NotImplementedError
 
-    def as_dict(self, *exclude_fields: str) -> dict[str, Any]:
-        exclude_fields = list(exclude_fields)
-        exclude_fields.append("_sa_instance_state")
-        return {
-            name: value
-            for name, value in self.__dict__.items()
-            if name not in exclude_fields
+    @classmethod
+    @cache
+    def _column_keys(cls) -> tuple[str, ...]:
+        """attribute keys in the table column order"""
+
+        keys = {
+            prop.columns[0]: prop.key for prop in inspect(cls).column_attrs
         }
+        return tuple(
+            keys[column] for column in cls.__table__.columns if column in keys
+        )
+
+    @classmethod
+    @cache
+    def _getters(cls, exclude_fields: tuple[str, ...]):
+        """(keys, to_dict, to_tuple) for `__dict__` of an instance,
+        generated once per class and exclude set"""
+
+        keys = tuple(k for k in cls._column_keys() if k not in exclude_fields)
+        return keys, *_item_getters(keys)
+
+    def _loaded_values(self, keys: tuple[str, ...]) -> dict[str, Any]:
+        # not loaded (expired, deferred) attributes are skipped
+        values = self.__dict__
+        return {key: values[key] for key in keys if key in values}
+
+    def as_dict(self, *exclude_fields: str) -> dict[str, Any]:
+        keys, to_dict, _ = self._getters(exclude_fields)
+        try:
+            return to_dict(self.__dict__)
+        except KeyError:
+            return self._loaded_values(keys)
 
     def as_tuple(self, *exclude_fields: str) -> tuple:
-        return tuple(self.as_dict(*exclude_fields).values())
+        keys, _, to_tuple = self._getters(exclude_fields)
+        try:
+            return to_tuple(self.__dict__)
+        except KeyError:
+            return tuple(self._loaded_values(keys).values())
+
+    @classmethod
+    def as_dicts(
+        cls, rows: Iterable["Base"], *exclude_fields: str
+    ) -> list[dict[str, Any]]:
+        keys, to_dict, _ = cls._getters(exclude_fields)
+        result = []
+        for row in rows:
+            try:
+                result.append(to_dict(row.__dict__))
+            except KeyError:
+                result.append(row._loaded_values(keys))
+        return result
+
+    @classmethod
+    @cache
+    def _field_names(cls) -> frozenset[str]:
+        return frozenset(c.name for c in cls.__table__.columns)
 
     @classmethod
     def all_fields(cls):
-        return {c.name for c in cls.__table__.columns}
+        return set(cls._field_names())
 
     @classmethod
     def from_dict(cls, values: dict[str, any]):
         """Danger method! Values should be validated with model before call."""
-        fields = cls.all_fields()
+        fields = cls._field_names()
         instance = cls()
         for field, value in values.items():
             if field in fields:
                 setattr(instance, field, value)
         return instance
 
+    @classmethod
+    def from_dicts(cls, values_list: Iterable[dict[str, Any]]) -> list:
+        return [cls.from_dict(values) for values in values_list]
+
+
+def _item_getters(keys: tuple[str, ...]):
+    """(to_dict, to_tuple) of the keys, KeyError means
+    an attribute is not loaded"""
+
+    def to_dict(d: dict) -> dict[str, Any]:
+        return {key: d[key] for key in keys}
+
+    if not keys:
+        return to_dict, lambda d: ()
+    getter = operator.itemgetter(*keys)
+    if len(keys) == 1:
+
+        def to_tuple(d: dict) -> tuple:
+            return (getter(d),)
+
+    else:
+        to_tuple = getter
+    return to_dict, to_tuple
+
 
 class BigIDMixin:
     """Provides id"""
@@ -118,6 +209,9 @@ class DateCreatedMixin:
     created_at: Mapped[datetime.datetime] = mapped_column(
         server_default=func.now()
     )
+    # max age of rows as "30d" (convert_time), None - kept forever,
+    # see summary_bot.retention
+    retention_age: ClassVar[str | None] = None
 
     @classmethod
     def order_fields(cls) -> list[str]:
@@ -138,6 +232,57 @@ class DateMixin(DateCreatedMixin):
         return ["created_at", "last_modified"]
 
 
+def _identity_columns(table) -> list[Column]:
+    return [c for c in table.primary_key if c.name != PARTITION_COLUMN]
+
+
+class CreatedRangePartitionMixin(DateCreatedMixin):
+    """Range partitions by `created_at`, see `summary_bot.partitions`.
+    PostgreSQL needs the partition key in every unique constraint,
+    so the table primary key is (created_at, id), the ORM identity
+    is still id alone."""
+
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        server_default=func.now(), primary_key=True
+    )
+    # partitions created in advance
+    partitions_ahead: ClassVar[int] = 3
+
+    @classmethod
+    def partition_interval(cls) -> PartitionInterval | None:
+        return "month"
+
+    @declared_attr.directive
+    def __mapper_args__(cls) -> dict[str, Any]:
+        return {"primary_key": _identity_columns(cls.__table__)}
+
+
+@event.listens_for(Base, "instrument_class", propagate=True)
+def _partition_table(mapper, cls) -> None:
+    if cls.partition_interval() is None or "__table__" not in vars(cls):
+        return
+    table = cls.__table__
+    if table.dialect_kwargs.get("postgresql_partition_by"):
+        return
+    table.dialect_kwargs["postgresql_partition_by"] = (
+        f"RANGE ({PARTITION_COLUMN})"
+    )
+    columns = _identity_columns(table)
+    if (
+        len(columns) == 1
+        and columns[0].autoincrement == "auto"
+        and isinstance(columns[0].type, Integer)
+    ):
+        # "auto" is a serial only for a single column primary key,
+        # the key is rendered serial first - (id, created_at)
+        columns[0].autoincrement = True
+        indexed = [table.c[PARTITION_COLUMN]]
+    else:
+        indexed = columns
+    # the lookups the primary key index does not lead with
+    Index(f"ix_{table.name}_{'_'.join(c.name for c in indexed)}", *indexed)
+
+
 class BigIdCreatedDateBaseMixin(BigIDMixin, DateCreatedMixin):
     @classmethod
     def order_fields(cls) -> list[str]:
@@ -188,16 +333,72 @@ class BoundDbModel:
 
     @classmethod
     def date_bounds(
-        cls, eq_filters: FilterType | list[bool], **kwargs
+        cls,
+        eq_filters: FilterType | list[bool],
+        partition_ranges: list[tuple[Any, Any]] | None = None,
+        **kwargs,
     ) -> "Select":
+        """`partition_ranges` - (lower, upper) of the range partitions
+        by the date column in order, see `summary_bot.partitions`"""
+
         date_column = cls.bound_date_column()
+        filters = (
+            list(eq_filters)
+            if isinstance(eq_filters, Iterable)
+            else [eq_filters]
+        )
+        if (
+            partition_ranges
+            and date_column.name == PARTITION_COLUMN
+            and all(
+                upper == lower
+                for (_, upper), (lower, _) in zip(
+                    partition_ranges, partition_ranges[1:]
+                )
+            )
+        ):
+            return _partitioned_date_bounds(
+                date_column, filters, partition_ranges
+            )
         return select(
             func.min(date_column).label(MIN_DATE_SQL_LABEL),
             func.max(date_column).label(MAX_DATE_SQL_LABEL),
-        ).filter(
-            *eq_filters if isinstance(eq_filters, Iterable) else eq_filters
+        ).filter(*filters)
+
+
+def _partitioned_date_bounds(
+    date_column: Column, filters: list, ranges: list[tuple[Any, Any]]
+) -> Select:
+    """The min of the first partition with rows instead of the min of
+    each one: COALESCE evaluates the subqueries lazily, each of them
+    is pruned to one partition; the DEFAULT one holds the dates out of
+    the (contiguous) ranges."""
+
+    def bound(aggregate, *where):
+        return (
+            select(aggregate(date_column))
+            .where(*filters, *where)
+            .scalar_subquery()
         )
 
+    in_ranges = [
+        and_(date_column >= lower, date_column < upper)
+        for lower, upper in ranges
+    ]
+    outside = or_(date_column < ranges[0][0], date_column >= ranges[-1][1])
+    return select(
+        func.least(
+            bound(func.min, outside),
+            func.coalesce(*(bound(func.min, where) for where in in_ranges)),
+        ).label(MIN_DATE_SQL_LABEL),
+        func.greatest(
+            bound(func.max, outside),
+            func.coalesce(
+                *(bound(func.max, where) for where in reversed(in_ranges))
+            ),
+        ).label(MAX_DATE_SQL_LABEL),
+    )
+
 
 def id_column(model_name_id: str) -> str:
     """jus a simple function that converts ModelName to model_name
@@ -214,68 +415,156 @@ def id_column(model_name_id: str) -> str:
 #  custom column types
 
 
-class IntEnumDecorator(type):
-    @staticmethod
-    def process_bind_param(obj, value: IntEnum, dialect):
-        if value is not None:
-            return value.value
-
-    @staticmethod
-    def process_result_value(obj, value: Integer, dialect, enumcls):
-        if value is not None:
-            return enumcls(value)
+class IntEnumType(TypeDecorator):
+    """IntEnum column with lookup tables built once per type instance.
+    `storage`: "integer", "smallint" or "native" - member names
+    in a PG ENUM named `type_name` (snake case of the enum by default),
+    VARCHAR on other dialects."""
 
-    def __new__(cls, clsname, superclasses, attributedict, enumcls):
-        clsname = clsname.replace("Enum", "")
-        process_result_value = (
-            lambda obj, value, dialect: cls.process_result_value(
-                obj, value, dialect, enumcls
+    impl = Integer
+    cache_ok = True
+    # set by subclasses which do not pass `enumcls`, see IntEnumDecorator
+    enumcls: type[IntEnum] | None = None
+
+    def __init__(
+        self,
+        enumcls: type[IntEnum] | None = None,
+        storage: Literal["integer", "smallint", "native"] = "integer",
+        type_name: str | None = None,
+    ):
+        super().__init__()
+        self.enumcls = enumcls = enumcls or self.enumcls
+        if enumcls is None:
+            raise TypeError("IntEnumType requires an IntEnum class")
+        self.storage = storage
+        self.type_name = type_name
+        if storage == "smallint":
+            self.impl = SmallInteger()
+        elif storage == "native":
+            self.impl = Enum(
+                *(member.name for member in enumcls),
+                name=type_name or camel_to_snake(enumcls.__name__),
             )
+        elif storage != "integer":
+            raise ValueError(f"Unknown enum storage {storage!r}")
+
+        db_value = operator.attrgetter(
+            "name" if storage == "native" else "value"
         )
-        superclasses = (*superclasses, TypeDecorator)
-        attributedict.update(
-            impl=Integer,
-            enumcls=enumcls,
-            process_bind_param=cls.process_bind_param,
-            process_result_value=process_result_value,
+        # members hash as their int values, so ints are accepted too
+        self._to_db = {member: db_value(member) for member in enumcls}
+        self._to_db[None] = None
+        self._from_db = {db_value(member): member for member in enumcls}
+        self._from_db[None] = None
+
+    def _lookup(self, table: dict) -> Callable[[Any], Any]:
+        enum_name = self.enumcls.__name__
+
+        def process(value):
+            try:
+                return table[value]
+            except KeyError:
+                raise ValueError(
+                    f"{value!r} is not a valid {enum_name}"
+                ) from None
+
+        return process
+
+    def process_bind_param(self, value, dialect):
+        return self._lookup(self._to_db)(value)
+
+    def process_result_value(self, value, dialect):
+        return self._lookup(self._from_db)(value)
+
+    def bind_processor(self, dialect):
+        process = self._lookup(self._to_db)
+        if self.storage == "native":
+            # the table already gives valid labels
+            return process
+        return codecs.chain(
+            process, self.impl_instance.bind_processor(dialect)
         )
-        return type.__new__(cls, clsname, superclasses, attributedict)
 
+    def result_processor(self, dialect, coltype):
+        process = self._lookup(self._from_db)
+        if self.storage == "native":
+            return process
+        return codecs.chain(
+            self.impl_instance.result_processor(dialect, coltype), process
+        )
+
+    @property
+    def python_type(self):
+        return self.enumcls
+
+
+class IntEnumDecorator(type):
+    """`class StatusEnum(metaclass=IntEnumDecorator, enumcls=Status)`
+    gives an IntEnumType subclass bound to the enum, the same as
+    `IntEnumType(Status)`"""
 
-class TMP(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    t: datetime.datetime
+    def __new__(cls, clsname, superclasses, attributedict, enumcls):
+        clsname = clsname.replace("Enum", "")
+        superclasses = (*superclasses, IntEnumType)
+        # cache_ok is looked up in the own class dict only
+        attributedict.setdefault("cache_ok", True)
+        attributedict.update(enumcls=enumcls)
+        return type.__new__(cls, clsname, superclasses, attributedict)
 
 
 class UnixTimestamp(TypeDecorator):
+    """seconds since epoch in an integer column, aware UTC datetime
+    in python"""
+
     impl = Integer
+    cache_ok = True
 
-    def process_bind_param(self, value: datetime.datetime, dialect):
-        match value:
-            case datetime.datetime():
-                return value.timestamp()
-            case str():
+    def process_bind_param(self, value, dialect):
+        return codecs.to_timestamp(value)
 
-                return int(TMP(t=value).t.timestamp())
-            case _:
-                return value
+    def process_result_value(self, value, dialect):
+        return codecs.from_timestamp(value)
+
+    # closures without the per value dispatch of TypeDecorator
+    def bind_processor(self, dialect):
+        return codecs.chain(
+            codecs.to_timestamp, self.impl_instance.bind_processor(dialect)
+        )
+
+    def result_processor(self, dialect, coltype):
+        return codecs.chain(
+            self.impl_instance.result_processor(dialect, coltype),
+            codecs.from_timestamp,
+        )
 
     @property
     def python_type(self):
-        return datetime.datetime  # TODO: Mb change to small int
+        return datetime.datetime
 
 
 class MyDateTime(TypeDecorator):
+    """wall time in a timestamp without time zone column,
+    aware UTC datetime in python"""
+
     impl = DateTime
+    cache_ok = True
 
     def process_bind_param(self, value, dialect):
-        match value:
-            case datetime.datetime():
-                return value.replace(tzinfo=None)
-            case str():
-                return TMP(t=value).t
-            case _:
-                return value  # TODO: CHANGE
+        return codecs.drop_tzinfo(value)
+
+    def process_result_value(self, value, dialect):
+        return codecs.as_utc(value)
+
+    def bind_processor(self, dialect):
+        return codecs.chain(
+            codecs.drop_tzinfo, self.impl_instance.bind_processor(dialect)
+        )
+
+    def result_processor(self, dialect, coltype):
+        return codecs.chain(
+            self.impl_instance.result_processor(dialect, coltype),
+            codecs.as_utc,
+        )
 
     @property
     def python_type(self):
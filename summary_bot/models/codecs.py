@@ -0,0 +1,91 @@
+"""Value conversion of the custom column types. Binding keeps the meaning
+of the stored values: a naive datetime is local time for a unix
+timestamp, an aware one keeps its wall time in a timestamp column.
+Results come back aware in UTC."""
+
+import datetime
+from collections.abc import Callable
+from typing import Any
+
+from pydantic import TypeAdapter
+
+UTC = datetime.timezone.utc
+_datetime = datetime.datetime
+_combine = _datetime.combine
+
+Processor = Callable[[Any], Any]
+
+# datetime arithmetic is several times faster than replace(tzinfo=...)
+_EPOCH = _datetime(1970, 1, 1)
+_EPOCH_UTC = _datetime(1970, 1, 1, tzinfo=UTC)
+_SECOND = datetime.timedelta(seconds=1)
+
+# formats fromisoformat does not know, e.g. unix time in a string
+_lenient_datetime = TypeAdapter(datetime.datetime)
+
+
+def parse_datetime(value: str) -> datetime.datetime:
+    try:
+        return _datetime.fromisoformat(value)
+    except ValueError:
+        return _lenient_datetime.validate_python(value)
+
+
+def to_timestamp(value: Any) -> Any:
+    value_type = type(value)
+    if value_type is str:
+        value = parse_datetime(value)
+    elif value_type is not _datetime:
+        if value_type is float:
+            return int(value)
+        if not isinstance(value, _datetime):
+            # int and None
+            return value
+    if value.tzinfo is UTC:
+        return int((value - _EPOCH_UTC) / _SECOND)
+    # a naive value is local time, as with the previous .timestamp()
+    return int(value.timestamp())
+
+
+def from_timestamp(value: Any) -> datetime.datetime | None:
+    if value is None:
+        return None
+    return _EPOCH_UTC + _SECOND * value
+
+
+def drop_tzinfo(value: Any) -> Any:
+    """the wall time, the offset of an aware value is not applied"""
+
+    value_type = type(value)
+    if value_type is str:
+        value = parse_datetime(value)
+    elif value_type is not _datetime and not isinstance(value, _datetime):
+        return value
+    tzinfo = value.tzinfo
+    if tzinfo is None:
+        return value
+    if tzinfo is UTC:
+        return _EPOCH + (value - _EPOCH_UTC)
+    # several times faster than replace(tzinfo=None)
+    return _combine(value.date(), value.time())
+
+
+def as_utc(value: Any) -> datetime.datetime | None:
+    if value is None or value.tzinfo is not None:
+        return value
+    return _EPOCH_UTC + (value - _EPOCH)
+
+
+def chain(first: Processor | None, second: Processor | None) -> Processor:
+    """one closure for the column value and the impl type processor,
+    a missing (None) processor is skipped"""
+
+    if first is None:
+        return second
+    if second is None:
+        return first
+
+    def process(value):
+        return second(first(value))
+
+    return process
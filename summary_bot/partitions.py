@@ -0,0 +1,232 @@
+"""Range partitions of CreatedRangePartitionMixin models: the partitions
+of the coming periods are created in advance, the ones older than the
+retention age are dropped (or detached) as a whole, run by
+`summary_bot.retention`. The migration of a partitioned table creates
+a DEFAULT partition for the rows outside of every range."""
+
+import datetime
+import re
+import time
+from collections.abc import Iterable
+from typing import Any, NamedTuple
+
+import loguru
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from summary_bot.models import Base, load_models
+from summary_bot.models.base import PARTITION_COLUMN, PartitionInterval
+
+_DAY = datetime.timedelta(days=1)
+_RANGE_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+# seconds, partitions of other processes are seen after this
+RANGES_TTL = 300.0
+_ranges: dict[str, tuple[float, list[tuple[Any, Any]]]] = {}
+
+
+class Partition(NamedTuple):
+    name: str
+    # None - the DEFAULT partition
+    lower: datetime.datetime | None
+    upper: datetime.datetime | None
+
+
+class PartitionChanges(NamedTuple):
+    model: type
+    created: list[str]
+    # dropped or detached
+    removed: list[str]
+
+    @property
+    def table(self) -> str:
+        return self.model.__tablename__
+
+
+def partition_name(table: str, start: datetime.datetime) -> str:
+    return f"{table}_p{start:%Y%m%d}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def is_partition_name(name: str, metadata) -> bool:
+    """a partition of a partitioned table of `metadata`,
+    by the names `summary_bot.partitions` gives them"""
+
+    for table in metadata.tables.values():
+        if not table.dialect_kwargs.get("postgresql_partition_by"):
+            continue
+        if name == default_partition_name(table.name):
+            return True
+        if re.fullmatch(rf"{re.escape(table.name)}_p\d{{8}}", name):
+            return True
+    return False
+
+
+def period_start(
+    value: datetime.datetime, interval: PartitionInterval
+) -> datetime.datetime:
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return value - _DAY * value.weekday()
+    if interval == "month":
+        return value.replace(day=1)
+    return value
+
+
+def next_period(
+    start: datetime.datetime, interval: PartitionInterval
+) -> datetime.datetime:
+    if interval == "day":
+        return start + _DAY
+    if interval == "week":
+        return start + 7 * _DAY
+    return (start.replace(day=28) + 4 * _DAY).replace(day=1)
+
+
+def partitioned_models(tables: list[str] | None = None) -> list[type]:
+    return sorted(
+        (
+            model
+            for model in load_models().values()
+            if model.partition_interval() is not None
+            and "__table__" in vars(model)
+            and (not tables or model.__tablename__ in tables)
+        ),
+        key=lambda model: model.__tablename__,
+    )
+
+
+async def list_partitions(
+    conn: AsyncConnection, table: str
+) -> list[Partition]:
+    rows = await conn.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)"
+            " FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+            " WHERE i.inhparent = CAST(:table AS regclass)"
+        ),
+        {"table": table},
+    )
+    result = []
+    for name, bound in rows:
+        if bound == "DEFAULT":
+            result.append(Partition(name, None, None))
+        elif match := _RANGE_BOUND.search(bound):
+            lower, upper = map(datetime.datetime.fromisoformat, match.groups())
+            result.append(Partition(name, lower, upper))
+        # MINVALUE / MAXVALUE ranges are not ours
+    return sorted(result, key=lambda p: p.lower or datetime.datetime.min)
+
+
+async def partition_ranges(
+    session: AsyncSession, model: type[Base]
+) -> list[tuple[Any, Any]]:
+    """(lower, upper) of the range partitions in order, cached for
+    `BoundDbModel.date_bounds`"""
+
+    table = model.__tablename__
+    cached = _ranges.get(table)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    conn = await session.connection()
+    ranges = [
+        (p.lower, p.upper)
+        for p in await list_partitions(conn, table)
+        if p.lower is not None
+    ]
+    _ranges[table] = (time.monotonic() + RANGES_TTL, ranges)
+    return ranges
+
+
+def _literal(value: datetime.datetime) -> str:
+    return f"'{value.isoformat(sep=' ')}'"
+
+
+async def _now(conn: AsyncConnection, model: type) -> datetime.datetime:
+    # in the terms of the column, the rows get the database clock
+    column = model.__table__.c[PARTITION_COLUMN]
+    now = func.now() if column.type.timezone else func.localtimestamp()
+    return await conn.scalar(select(now))
+
+
+async def _execute_ddl(engine: AsyncEngine, statement: str) -> bool:
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(statement))
+    except DBAPIError as error:
+        # e.g. rows of the range are in the DEFAULT partition already
+        loguru.logger.error(f"{statement} failed: {error.orig}")
+        return False
+    return True
+
+
+async def maintain(
+    engine: AsyncEngine,
+    model: type[Base],
+    max_age: datetime.timedelta | None = None,
+    detach: bool = False,
+) -> PartitionChanges:
+    """Create the partitions up to `partitions_ahead` periods,
+    remove the ones whose rows are all older than `max_age`"""
+
+    table = model.__tablename__
+    interval = model.partition_interval()
+    quote = engine.dialect.identifier_preparer.quote
+    async with engine.connect() as conn:
+        now = await _now(conn, model)
+        partitions = await list_partitions(conn, table)
+    ranges = [p for p in partitions if p.lower is not None]
+
+    created = []
+    start = period_start(now, interval)
+    for _ in range(model.partitions_ahead + 1):
+        end = next_period(start, interval)
+        if not any(p.lower < end and start < p.upper for p in ranges):
+            name = partition_name(table, start)
+            if await _execute_ddl(
+                engine,
+                f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)}"
+                f" FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)})",
+            ):
+                created.append(name)
+        start = end
+
+    removed = []
+    if max_age is not None:
+        cutoff = now - max_age
+        for partition in ranges:
+            if partition.upper > cutoff:
+                continue
+            if detach:
+                statement = (
+                    f"ALTER TABLE {quote(table)}"
+                    f" DETACH PARTITION {quote(partition.name)}"
+                )
+            else:
+                statement = f"DROP TABLE {quote(partition.name)}"
+            if await _execute_ddl(engine, statement):
+                removed.append(partition.name)
+    if created or removed:
+        _ranges.pop(table, None)
+    return PartitionChanges(model, created, removed)
+
+
+async def maintain_all(
+    engine: AsyncEngine,
+    models: Iterable[type[Base]],
+    max_ages: dict[type, datetime.timedelta],
+    detach: bool = False,
+) -> list[PartitionChanges]:
+    result = []
+    for model in models:
+        changes = await maintain(engine, model, max_ages.get(model), detach)
+        if changes.created or changes.removed:
+            loguru.logger.info(
+                f"Partitions of {changes.table}: created {changes.created},"
+                f" {'detached' if detach else 'dropped'} {changes.removed}"
+            )
+        result.append(changes)
+    return result
@@ -0,0 +1,305 @@
+"""Purge of rows older than the retention age of DateCreatedMixin models.
+Rows go in batches of primary keys in their order, each batch is its
+own transaction and starts after the last key of the previous one,
+so locks and WAL stay small and replicas keep up; a run stops at its
+time budget and the next run goes on. Expired partitions of
+partitioned models are dropped as a whole first (summary_bot.partitions).
+
+    python -m summary_bot.retention [--table mats_logs] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import datetime
+import sys
+import time
+from typing import NamedTuple
+
+import loguru
+from sqlalchemy import (
+    bindparam,
+    delete,
+    func,
+    inspect,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.sql import Select
+
+from summary_bot.config import Retention, get_settings
+from summary_bot.crud.date_bounds import date_bounds_cache
+from summary_bot.crud.result_cache import clear_model_caches
+from summary_bot.db import dispose_engines, get_engine, init_engines
+from summary_bot.metrics import Counter, registry
+from summary_bot.models import load_models
+from summary_bot.models.base import BoundDbModel, DateCreatedMixin
+from summary_bot.partitions import maintain_all, partitioned_models
+from summary_bot.utils.common import convert_time
+
+# one purge at a time over every worker and host
+ADVISORY_LOCK_KEY = 7_311_042
+# log the progress of a table every N batches
+PROGRESS_EVERY = 20
+
+deleted_rows = registry.register(
+    Counter(
+        "summary_bot_retention_deleted_total",
+        "Rows deleted by the retention purge",
+        ("table",),
+    )
+)
+
+
+class Policy(NamedTuple):
+    model: type
+    max_age: datetime.timedelta
+
+    @property
+    def table(self) -> str:
+        return self.model.__tablename__
+
+
+class PurgeReport(NamedTuple):
+    table: str
+    deleted: int
+    batches: int
+    elapsed: float
+    # False - stopped by the time budget, rows are left for the next run
+    complete: bool
+
+
+def policies(
+    settings: Retention, tables: list[str] | None = None
+) -> list[Policy]:
+    """models with a retention age, the settings override the models"""
+
+    result = []
+    for model in load_models().values():
+        if not issubclass(model, DateCreatedMixin):
+            continue
+        if "__table__" not in vars(model):
+            # abstract or single table inheritance
+            continue
+        table = model.__tablename__
+        age = settings.ages.get(table, model.retention_age)
+        if not age or (tables and table not in tables):
+            continue
+        seconds = convert_time(age)
+        result.append(Policy(model, datetime.timedelta(seconds=seconds)))
+    return sorted(result, key=lambda policy: policy.table)
+
+
+def _expired(policy: Policy):
+    created_at = policy.model.__table__.c.created_at
+    return created_at < func.now() - policy.max_age
+
+
+def _cursor_param(column) -> str:
+    return f"after_{column.key}"
+
+
+def batch_delete(
+    policy: Policy, batch_size: int, after_cursor: bool = False
+) -> Select:
+    """DELETE ... WHERE pk IN (SELECT pk ... [AND pk > :after]
+    ORDER BY pk LIMIT batch_size) RETURNING pk, wrapped into a SELECT
+    of (deleted count, pk...) of the last deleted row, the next batch
+    starts after it instead of scanning the purged range again"""
+
+    table = policy.model.__table__
+    pk_columns = list(inspect(policy.model).primary_key)
+    expired = select(*pk_columns).where(_expired(policy))
+    if after_cursor:
+        after = [
+            bindparam(_cursor_param(c), type_=c.type) for c in pk_columns
+        ]
+        if len(pk_columns) == 1:
+            expired = expired.where(pk_columns[0] > after[0])
+        else:
+            expired = expired.where(tuple_(*pk_columns) > tuple_(*after))
+    expired = expired.order_by(*pk_columns).limit(batch_size)
+    if len(pk_columns) == 1:
+        where = pk_columns[0].in_(expired)
+    else:
+        where = tuple_(*pk_columns).in_(expired)
+    deleted = (
+        delete(table).where(where).returning(*pk_columns).cte("deleted")
+    )
+    deleted_pk = [deleted.c[c.name] for c in pk_columns]
+    return (
+        select(func.count().over(), *deleted_pk)
+        .order_by(*(c.desc() for c in deleted_pk))
+        .limit(1)
+    )
+
+
+def _forget_cached(model: type) -> None:
+    # the caches of this process, other workers wait for the TTL
+    clear_model_caches(model)
+    if issubclass(model, BoundDbModel):
+        date_bounds_cache.invalidate(model)
+
+
+async def purge(
+    engine: AsyncEngine,
+    policy: Policy,
+    settings: Retention,
+    deadline: float,
+) -> PurgeReport:
+    first = batch_delete(policy, settings.batch_size)
+    following = batch_delete(policy, settings.batch_size, after_cursor=True)
+    pk_columns = list(inspect(policy.model).primary_key)
+    cursor = None
+    started = time.monotonic()
+    deleted = batches = 0
+    complete = False
+    while time.monotonic() < deadline:
+        async with engine.begin() as conn:
+            if cursor is None:
+                row = (await conn.execute(first)).first()
+            else:
+                row = (await conn.execute(following, cursor)).first()
+        rowcount = row[0] if row is not None else 0
+        if row is not None:
+            cursor = {
+                _cursor_param(c): value
+                for c, value in zip(pk_columns, row[1:])
+            }
+        batches += 1
+        deleted += rowcount
+        if rowcount:
+            deleted_rows.inc((policy.table,), rowcount)
+            _forget_cached(policy.model)
+        if rowcount < settings.batch_size:
+            complete = True
+            break
+        if batches % PROGRESS_EVERY == 0:
+            loguru.logger.info(
+                f"Retention of {policy.table}: {deleted} rows deleted"
+                f" in {time.monotonic() - started:.1f}s"
+            )
+        await asyncio.sleep(settings.batch_sleep)
+    return PurgeReport(
+        policy.table, deleted, batches, time.monotonic() - started, complete
+    )
+
+
+async def count_expired(engine: AsyncEngine, policy: Policy) -> int:
+    stmt = select(func.count()).select_from(policy.model.__table__)
+    async with engine.connect() as conn:
+        return await conn.scalar(stmt.where(_expired(policy)))
+
+
+async def _try_lock(conn: AsyncConnection) -> bool:
+    return await conn.scalar(
+        text("SELECT pg_try_advisory_lock(:key)"),
+        {"key": ADVISORY_LOCK_KEY},
+    )
+
+
+async def run(
+    settings: Retention,
+    tables: list[str] | None = None,
+    engine: AsyncEngine | None = None,
+) -> list[PurgeReport] | None:
+    """Partitions maintenance, then one purge of every policy within
+    the time budget, None if another process holds the purge lock"""
+
+    engine = engine or get_engine()
+    deadline = time.monotonic() + convert_time(settings.time_budget)
+    reports = []
+    async with engine.connect() as lock_conn:
+        if not await _try_lock(lock_conn):
+            loguru.logger.info("Retention purge runs in another process")
+            return None
+        try:
+            selected = policies(settings, tables)
+            for changes in await maintain_all(
+                engine,
+                partitioned_models(tables),
+                {policy.model: policy.max_age for policy in selected},
+                settings.detach_partitions,
+            ):
+                if changes.removed:
+                    _forget_cached(changes.model)
+            for policy in selected:
+                report = await purge(engine, policy, settings, deadline)
+                reports.append(report)
+                loguru.logger.info(
+                    f"Retention of {report.table}: {report.deleted} rows"
+                    f" deleted in {report.batches} batches,"
+                    f" {report.elapsed:.1f}s"
+                    f"{'' if report.complete else ', time budget is over'}"
+                )
+        finally:
+            await lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"),
+                {"key": ADVISORY_LOCK_KEY},
+            )
+    return reports
+
+
+async def run_periodically(settings: Retention) -> None:
+    """background task of the app, cancelled on shutdown"""
+
+    interval = convert_time(settings.interval)
+    while True:
+        try:
+            await run(settings)
+        except Exception:
+            loguru.logger.exception("Retention purge failed")
+        await asyncio.sleep(interval)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m summary_bot.retention")
+    parser.add_argument(
+        "--table", action="append", help="only these tables, repeatable"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="count the expired rows"
+    )
+    parser.add_argument("--time-budget", help='e.g. "30m"')
+    parser.add_argument("--batch-size", type=int)
+    return parser.parse_args(argv)
+
+
+async def _main(args: argparse.Namespace) -> int:
+    settings = get_settings().retention
+    overrides = {
+        "time_budget": args.time_budget,
+        "batch_size": args.batch_size,
+    }
+    settings = settings.model_copy(
+        update={k: v for k, v in overrides.items() if v is not None}
+    )
+    engine = init_engines()
+    try:
+        if args.dry_run:
+            for policy in policies(settings, args.table):
+                expired = await count_expired(engine, policy)
+                print(f"{policy.table:<40} {expired} rows to delete")
+            return 0
+        reports = await run(settings, args.table, engine)
+    finally:
+        await dispose_engines()
+    if reports is None:
+        print("another purge is running")
+        return 1
+    for report in reports:
+        print(
+            f"{report.table:<40} {report.deleted} rows"
+            f"  {report.batches} batches  {report.elapsed:.1f}s"
+            f"{'' if report.complete else '  incomplete'}"
+        )
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    return asyncio.run(_main(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
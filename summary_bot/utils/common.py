@@ -1,5 +1,6 @@
 import datetime
 import re
+from enum import Enum
 from functools import cache
 from typing import Any, TypeVar
 
@@ -33,6 +34,16 @@ class EnumDescriptionMixin:
         return schema
 
 
+class ComparisonType(EnumDescriptionMixin, str, Enum):
+    """lookups of `**filter_dict`, see `summary_bot.crud.filters`"""
+
+    EQ = "eq"
+    IN = "in"
+    RANGE = "range"
+    PREFIX = "prefix"
+    IS_NULL = "is_null"
+
+
 def snake_to_camel(snake_case_string: str) -> str:
     return "".join(
         word if not index else word.capitalize()
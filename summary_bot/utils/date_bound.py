@@ -1,7 +1,20 @@
+from collections.abc import Iterable
+from contextlib import nullcontext
 from datetime import datetime
+
+from fastapi import Response
 from pydantic import Field
 from sqlalchemy.ext.asyncio.session import AsyncSession
+
+from summary_bot.crud.date_bounds import (
+    MISSING,
+    date_bounds_cache,
+    filters_key,
+    has_pending,
+)
+from summary_bot.db import primary_reads
 from summary_bot.models.base import BoundDbModel
+from summary_bot.partitions import partition_ranges
 from summary_bot.schemas.base import OrmModel
 from summary_bot.utils.common import FilterType
 
@@ -22,14 +35,54 @@ class BaseHeaderDate(OrmModel):
         return self.model_dump(mode="json", by_alias=True, exclude_none=True)
 
 
+async def get_date_bounds(
+    session: AsyncSession,
+    model: type[BoundDbModel],
+    addition_filters: FilterType | list[bool],
+) -> BaseHeaderDate:
+    """min/max from `date_bounds_cache`, the aggregate runs on miss only"""
+
+    filters = (
+        list(addition_filters)
+        if isinstance(addition_filters, Iterable)
+        else [addition_filters]
+    )
+    key = None
+    if not has_pending(session, model):
+        key = filters_key(model, filters)
+    if key is not None:
+        cached = date_bounds_cache.get(key)
+        if cached is not MISSING:
+            x_min_date, x_max_date = cached
+            return BaseHeaderDate(x_min_date=x_min_date, x_max_date=x_max_date)
+
+    # the cached bounds are kept until a write, not from a lagging replica
+    with primary_reads(session) if key is not None else nullcontext():
+        ranges = None
+        if model.partition_interval() is not None:
+            ranges = await partition_ranges(session, model)
+        query = model.date_bounds(filters, partition_ranges=ranges)
+        boarders = (await session.execute(query)).first()
+    bounds = BaseHeaderDate.model_validate(boarders)
+    if key is not None:
+        date_bounds_cache.set(
+            key, filters, bounds.x_min_date, bounds.x_max_date
+        )
+    return bounds
+
+
 async def set_bounds_response(
     session: AsyncSession,
     model: type[BoundDbModel],
     addition_filters: FilterType | list[bool],
-) -> None:
-    query = model.date_bounds(addition_filters)
-    boarders = (await session.execute(query)).first()
-    # headers = BaseHeaderDate.model_validate(boarders).headers
+    response: Response | None = None,
+) -> dict[str, str]:
+    headers = (
+        await get_date_bounds(session, model, addition_filters)
+    ).headers
+    if response is not None:
+        response.headers.update(headers)
+    return headers
 
 
 BOUND_RESPOSE = {
@@ -0,0 +1,62 @@
+"""SQLite files stand in for the databases. The tests asking for
+`pg_engine` need PostgreSQL (ON CONFLICT, UPDATE ... FROM VALUES):
+TEST_DATABASE_URL=postgresql+asyncpg://... of a scratch database,
+they are skipped without it."""
+
+import asyncio
+import os
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from summary_bot.config import Settings
+from summary_bot.models import Base
+from tests.models import TABLES, TestItemCRUD, TestReadingCRUD
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+def create_engine(url: str) -> AsyncEngine:
+    # every test runs its own event loop, no connection outlives it
+    return create_async_engine(url, poolclass=NullPool)
+
+
+async def recreate_tables(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all, tables=TABLES)
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    def url(name: str = "primary") -> str:
+        return f"sqlite+aiosqlite:///{tmp_path / name}.db"
+
+    return url
+
+
+@pytest.fixture
+def engine(sqlite_url) -> AsyncEngine:
+    engine = create_engine(sqlite_url())
+    asyncio.run(recreate_tables(engine))
+    return engine
+
+
+@pytest.fixture
+def pg_engine() -> AsyncEngine:
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_engine(TEST_DATABASE_URL)
+    asyncio.run(recreate_tables(engine))
+    return engine
+
+
+@pytest.fixture
+def crud() -> TestItemCRUD:
+    return TestItemCRUD(settings=Settings())
+
+
+@pytest.fixture
+def reading_crud() -> TestReadingCRUD:
+    return TestReadingCRUD(settings=Settings())
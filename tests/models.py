@@ -0,0 +1,108 @@
+"""Tables only for tests"""
+
+import datetime
+import uuid
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import (
+    BigInteger,
+    ForeignKey,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from summary_bot.crud.base import CRUDBase
+from summary_bot.models import Base
+from summary_bot.models.base import (
+    BigIdDateBaseMixin,
+    BigIDMixin,
+    MyDateTime,
+)
+
+# only INTEGER PRIMARY KEY is autoincremented by SQLite
+BigId = BigInteger().with_variant(Integer, "sqlite")
+
+
+class TestOwner(BigIDMixin, Base):
+    __test__ = False
+
+    id: Mapped[int] = mapped_column(BigId, primary_key=True)
+    name: Mapped[str]
+
+
+class TestItem(BigIdDateBaseMixin, Base):
+    __test__ = False
+
+    id: Mapped[int] = mapped_column(BigId, primary_key=True)
+    serial: Mapped[str] = mapped_column(String(64), unique=True)
+    name: Mapped[str | None]
+    state: Mapped[int] = mapped_column(default=0)
+    owner_id: Mapped[int | None] = mapped_column(ForeignKey(TestOwner.id))
+    owner: Mapped[TestOwner | None] = relationship()
+
+    @classmethod
+    def filter_fields(cls) -> list[str]:
+        return ["serial", "state", "owner_id"]
+
+    @classmethod
+    def order_fields(cls) -> list[str]:
+        return ["id", "state", "serial"]
+
+
+class TestItemSchema(BaseModel):
+    __test__ = False
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    serial: str
+    name: str | None = None
+    state: int = 0
+    owner_id: int | None = None
+    created_at: datetime.datetime
+    last_modified: datetime.datetime
+
+
+class TestItemCreateSchema(BaseModel):
+    __test__ = False
+
+    serial: str
+    name: str | None = None
+    state: int = 0
+    owner_id: int | None = None
+
+
+class TestItemCRUD(CRUDBase[TestItem, TestItemSchema, TestItemCreateSchema]):
+    __test__ = False
+
+
+class TestReading(BigIDMixin, Base):
+    """keys the database returns in another type than they are given"""
+
+    __test__ = False
+    __table_args__ = (UniqueConstraint("device", "taken_at"),)
+
+    id: Mapped[int] = mapped_column(BigId, primary_key=True)
+    device: Mapped[uuid.UUID]
+    taken_at: Mapped[datetime.datetime] = mapped_column(MyDateTime)
+    value: Mapped[float | None]
+
+
+class TestReadingSchema(BaseModel):
+    __test__ = False
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    device: uuid.UUID
+    taken_at: datetime.datetime
+    value: float | None = None
+
+
+class TestReadingCRUD(
+    CRUDBase[TestReading, TestReadingSchema, TestReadingSchema]
+):
+    __test__ = False
+
+
+TABLES = [TestOwner.__table__, TestItem.__table__, TestReading.__table__]
@@ -0,0 +1,129 @@
+"""Bulk writes, INSERT ... ON CONFLICT and UPDATE ... FROM VALUES
+need PostgreSQL"""
+
+import asyncio
+import datetime
+import uuid
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+UTC = datetime.timezone.utc
+
+
+def test_get_or_create_many_normalized_keys(pg_engine, reading_crud):
+    device, other = uuid.uuid4(), uuid.uuid4()
+    naive = datetime.datetime(2024, 1, 1, 12)
+
+    async def scenario():
+        async with async_sessionmaker(pg_engine)() as session:
+            [stored] = await reading_crud.get_or_create_many(
+                session,
+                ["device", "taken_at"],
+                [{"device": device, "taken_at": naive, "value": 1.0}],
+            )
+            await session.commit()
+
+            result = await reading_crud.get_or_create_many(
+                session,
+                ["device", "taken_at"],
+                [
+                    # the database returns uuid.UUID and an aware datetime
+                    {"device": str(device), "taken_at": naive, "value": 2},
+                    {"device": str(other), "taken_at": naive.isoformat()},
+                    {"device": other, "taken_at": naive.replace(tzinfo=UTC)},
+                ],
+            )
+            assert result[0] is stored and result[0].value == 1.0
+            assert result[1] is result[2]
+            assert result[1].device == other
+
+    asyncio.run(scenario())
+
+
+class TestItemPatch(BaseModel):
+    __test__ = False
+
+    id: int
+    name: str | None = None
+    state: int = 0
+
+
+def test_update_many_writes_set_fields_only(pg_engine, crud):
+    async def scenario():
+        async with async_sessionmaker(pg_engine)() as session:
+            first, second = await crud.create_many(
+                session,
+                [
+                    {"serial": "s1", "name": "one", "state": 5},
+                    {"serial": "s2", "name": "two", "state": 6},
+                ],
+            )
+            updated = await crud.update_many(
+                session,
+                [
+                    # state is not set, its default must not be written
+                    TestItemPatch(id=first.id, name="first"),
+                    # an explicit None is written
+                    TestItemPatch(id=second.id, name=None),
+                    # merged with the patch of the same row
+                    {"id": second.id, "state": 7},
+                ],
+            )
+            assert updated == 2
+            session.expunge_all()
+            rows = {
+                row.serial: row for row in await crud.get_multi(session)
+            }
+            assert (rows["s1"].name, rows["s1"].state) == ("first", 5)
+            assert (rows["s2"].name, rows["s2"].state) == (None, 7)
+
+    asyncio.run(scenario())
+
+
+def test_upsert_many_updates_given_fields(pg_engine, crud):
+    async def scenario():
+        async with async_sessionmaker(pg_engine)() as session:
+            [existing] = await crud.create_many(
+                session, [{"serial": "s1", "name": "one", "state": 1}]
+            )
+            result = await crud.upsert_many(
+                session,
+                ["serial"],
+                [
+                    {"serial": "s1", "name": "uno"},
+                    {"serial": "s2", "name": "two"},
+                    # the last row of a key wins
+                    {"serial": "s2", "name": "dos"},
+                    # another key set, another statement
+                    {"serial": "s3", "name": "tres", "state": 3},
+                ],
+            )
+            rows = {row.serial: row for row in result}
+            assert sorted(rows) == ["s1", "s2", "s3"]
+            assert rows["s1"].id == existing.id
+            assert (rows["s1"].name, rows["s1"].state) == ("uno", 1)
+            assert (rows["s2"].name, rows["s2"].state) == ("dos", 0)
+            assert rows["s3"].state == 3
+            assert await crud.get_count(session) == 3
+
+    asyncio.run(scenario())
+
+
+def test_upsert_many_over_the_parameter_limit(pg_engine, crud):
+    # two parameters per row, 32767 // 2 rows per statement
+    size = 20_000
+
+    async def scenario():
+        async with async_sessionmaker(pg_engine)() as session:
+            objs = [
+                {"serial": f"s{index}", "state": 1} for index in range(size)
+            ]
+            inserted = await crud.upsert_many(session, ["serial"], objs)
+            for obj in objs:
+                obj["state"] = 2
+            updated = await crud.upsert_many(session, ["serial"], objs)
+            assert len(inserted) == len(updated) == size
+            assert await crud.get_count(session, state=2) == size
+
+    asyncio.run(scenario())
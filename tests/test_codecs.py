@@ -0,0 +1,59 @@
+import datetime
+import time
+
+import pytest
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+from summary_bot.models.base import MyDateTime, UnixTimestamp
+
+UTC = datetime.timezone.utc
+PLUS_3 = datetime.timezone(datetime.timedelta(hours=3))
+DIALECT = asyncpg_dialect()
+
+
+def _bind(type_, value):
+    process = type_.dialect_impl(DIALECT).bind_processor(DIALECT)
+    return value if process is None else process(value)
+
+
+def _result(type_, value):
+    process = type_.dialect_impl(DIALECT).result_processor(DIALECT, None)
+    return value if process is None else process(value)
+
+
+@pytest.fixture
+def local_time(monkeypatch):
+    # naive datetimes of UnixTimestamp are local time
+    monkeypatch.setenv("TZ", "Europe/Moscow")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_unix_timestamp_binds_naive_as_local_time(local_time):
+    naive = datetime.datetime(2024, 1, 1, 12)
+    assert _bind(UnixTimestamp(), naive) == int(naive.timestamp())
+    assert _bind(UnixTimestamp(), naive) == 1704099600
+    assert _bind(UnixTimestamp(), naive.isoformat()) == 1704099600
+    aware = naive.replace(tzinfo=UTC)
+    assert _bind(UnixTimestamp(), aware) == 1704110400
+    assert _bind(UnixTimestamp(), naive.replace(tzinfo=PLUS_3)) == 1704099600
+    assert _bind(UnixTimestamp(), 1704110400.7) == 1704110400
+    assert _bind(UnixTimestamp(), None) is None
+    assert _result(UnixTimestamp(), 1704110400) == aware
+
+
+def test_my_datetime_keeps_wall_time():
+    naive = datetime.datetime(2024, 1, 1, 12, 30, 1, 5)
+    for value in (
+        naive,
+        naive.replace(tzinfo=UTC),
+        naive.replace(tzinfo=PLUS_3),
+        naive.isoformat(),
+        naive.replace(tzinfo=PLUS_3).isoformat(),
+    ):
+        bound = _bind(MyDateTime(), value)
+        assert bound == naive and bound.tzinfo is None, value
+    assert _bind(MyDateTime(), None) is None
+    assert _result(MyDateTime(), naive) == naive.replace(tzinfo=UTC)
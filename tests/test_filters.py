@@ -0,0 +1,58 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from tests.models import TestItem, TestOwner
+
+
+async def _seed(session) -> tuple[TestOwner, TestOwner]:
+    alice, bob = TestOwner(name="alice"), TestOwner(name="bob")
+    session.add_all(
+        [
+            alice,
+            bob,
+            TestItem(serial="a1", owner=alice),
+            TestItem(serial="a2", owner=alice, state=1),
+            TestItem(serial="b1", owner=bob),
+        ]
+    )
+    await session.flush()
+    return alice, bob
+
+
+def test_filter_by_relationship(engine, crud):
+    async def scenario():
+        async with async_sessionmaker(engine)() as session:
+            alice, bob = await _seed(session)
+
+            items = await crud.get_multi(session, owner=alice)
+            assert sorted(item.serial for item in items) == ["a1", "a2"]
+            assert await crud.get_count(session, owner=bob) == 1
+            item = await crud.get_one(session, owner=alice, state=1)
+            assert item.serial == "a2"
+
+            updated = await crud.update(
+                session,
+                update_filter={"owner": bob},
+                update_values={"name": "of bob"},
+            )
+            assert updated == 1
+            assert (await crud.get_one(session, serial="b1")).name == "of bob"
+            assert await crud.delete(session, owner=alice) == 2
+            assert await crud.get_count(session) == 1
+
+    asyncio.run(scenario())
+
+
+def test_templated_filters_keep_values_apart(engine, crud):
+    async def scenario():
+        async with async_sessionmaker(engine)() as session:
+            await _seed(session)
+            for serial in ("a1", "a2", "b1"):
+                item = await crud.get_one(session, serial=serial)
+                assert item.serial == serial
+            assert await crud.get_count(session, state__range=(0, 0)) == 2
+            items = await crud.get_multi(session, serial__prefix="a")
+            assert {item.serial for item in items} == {"a1", "a2"}
+
+    asyncio.run(scenario())
@@ -0,0 +1,32 @@
+from sqlalchemy.orm import Mapped
+
+from summary_bot.indexes import IndexColumn, propose
+from summary_bot.models import Base
+from summary_bot.models.base import BigIDMixin, CreatedRangePartitionMixin
+
+
+class TestPartitionedLog(CreatedRangePartitionMixin, BigIDMixin, Base):
+    __test__ = False
+
+    message: Mapped[str]
+
+    @classmethod
+    def order_fields(cls) -> list[str]:
+        return ["created_at"]
+
+    @classmethod
+    def default_order_fields(cls) -> list[str]:
+        return ["desc_created_at"]
+
+
+def test_partitioned_primary_key_in_rendered_order():
+    # the table lists created_at first, PRIMARY KEY (id, created_at)
+    assert [c.name for c in TestPartitionedLog.__table__.primary_key] == [
+        "created_at",
+        "id",
+    ]
+    proposals = propose(TestPartitionedLog)
+    assert [p.columns for p in proposals] == [
+        (IndexColumn("created_at"), IndexColumn("id"))
+    ]
+    assert all(p.partitioned for p in proposals)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from summary_bot.crud.keyset import InvalidCursorEx
+
+STATES = [2, 0, 1, 0, 2, 1, 0]
+
+
+async def _pages(crud, session, order_fields, limit=3) -> list[list[int]]:
+    pages, cursor = [], None
+    while True:
+        page = await crud.get_multi_keyset(
+            session, limit, cursor, order_fields=order_fields
+        )
+        pages.append([item.id for item in page.items])
+        if page.next_cursor is None:
+            return pages
+        cursor = page.next_cursor
+
+
+@pytest.mark.parametrize(
+    "order_fields, key",
+    [
+        (None, lambda item: -item.id),
+        (["state"], lambda item: (item.state, item.id)),
+        (["desc_state"], lambda item: (-item.state, -item.id)),
+        # mixed directions are an OR of the seek conditions
+        (["desc_state", "id"], lambda item: (-item.state, item.id)),
+    ],
+)
+def test_pages_follow_the_order(engine, crud, order_fields, key):
+    async def scenario():
+        async with async_sessionmaker(engine)() as session:
+            items = await crud.create_many(
+                session,
+                [
+                    {"serial": f"s{index}", "state": state}
+                    for index, state in enumerate(STATES)
+                ],
+            )
+            expected = [item.id for item in sorted(items, key=key)]
+            pages = await _pages(crud, session, order_fields)
+            assert [len(page) for page in pages] == [3, 3, 1]
+            assert sum(pages, []) == expected
+
+    asyncio.run(scenario())
+
+
+def test_cursor_of_another_order_is_refused(engine, crud):
+    async def scenario():
+        async with async_sessionmaker(engine)() as session:
+            await crud.create_many(
+                session, [{"serial": f"s{index}"} for index in range(3)]
+            )
+            page = await crud.get_multi_keyset(
+                session, 1, order_fields=["state"]
+            )
+            with pytest.raises(InvalidCursorEx):
+                await crud.get_multi_keyset(
+                    session, 1, page.next_cursor, order_fields=["serial"]
+                )
+            with pytest.raises(InvalidCursorEx):
+                await crud.get_multi_keyset(session, 1, "not a cursor")
+
+    asyncio.run(scenario())
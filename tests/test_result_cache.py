@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from summary_bot.config import Settings
+from summary_bot.crud.result_cache import ResultCache
+from tests.models import TestItemCRUD
+
+
+class CachedItemCRUD(TestItemCRUD):
+    __test__ = False
+    result_cache_size = 16
+
+
+@pytest.fixture
+def cached_crud(monkeypatch) -> CachedItemCRUD:
+    # the cache is per class, a new one for every test database
+    monkeypatch.setattr(
+        CachedItemCRUD,
+        "_result_cache",
+        ResultCache(
+            CachedItemCRUD.result_cache_size, CachedItemCRUD.result_cache_ttl
+        ),
+    )
+    return CachedItemCRUD(settings=Settings())
+
+
+def test_commit_clears_the_cache(engine, cached_crud):
+    sessions = async_sessionmaker(engine)
+
+    async def name() -> str | None:
+        async with sessions() as session:
+            return (await cached_crud.get_one(session, serial="s1")).name
+
+    async def scenario():
+        async with sessions() as session:
+            await cached_crud.create(session, obj_in={"serial": "s1"})
+            await session.commit()
+        assert await name() is None
+        assert await name() is None
+        assert cached_crud.result_cache_stats["hits"] == 1
+
+        async with sessions() as writer:
+            await cached_crud.update(
+                writer,
+                update_filter={"serial": "s1"},
+                update_values={"name": "new"},
+            )
+            # the writer reads its own rows, they are not cached
+            assert (
+                await cached_crud.get_one(writer, serial="s1")
+            ).name == "new"
+            # a read between the write and the commit caches the old row
+            assert await name() is None
+            await writer.commit()
+        assert await name() == "new"
+
+    asyncio.run(scenario())
+
+
+def test_rolled_back_rows_do_not_get_cached(engine, cached_crud):
+    sessions = async_sessionmaker(engine)
+
+    async def scenario():
+        async with sessions() as session:
+            await cached_crud.create(session, obj_in={"serial": "s1"})
+            assert await cached_crud.get_count(session) == 1
+            assert len(await cached_crud.get_multi(session)) == 1
+            await session.rollback()
+            assert cached_crud.result_cache_stats["size"] == 0
+            # not written after the rollback, cached again
+            assert await cached_crud.get_multi(session) == []
+            assert await cached_crud.get_multi(session) == []
+        assert cached_crud.result_cache_stats["hits"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,123 @@
+"""RoutingSession against two SQLite files standing in for the primary
+and a replica, each holds a row telling which database answers"""
+
+import asyncio
+from itertools import cycle
+
+import pytest
+from sqlalchemy import select
+
+from summary_bot import db
+from summary_bot.config import Settings
+from summary_bot.db import (
+    async_session,
+    primary_reads,
+    replica_session,
+    use_primary,
+)
+from tests.conftest import create_engine, recreate_tables
+from tests.models import TestItem, TestItemCRUD
+
+
+@pytest.fixture
+def routed(monkeypatch, sqlite_url):
+    primary = create_engine(sqlite_url("primary"))
+    replica = create_engine(sqlite_url("replica"))
+
+    async def seed():
+        for engine, serial in ((primary, "primary"), (replica, "replica")):
+            await recreate_tables(engine)
+            async with engine.begin() as conn:
+                await conn.execute(
+                    TestItem.__table__.insert().values(serial=serial)
+                )
+
+    asyncio.run(seed())
+    monkeypatch.setattr(db, "_engine", primary)
+    monkeypatch.setattr(db, "_replica_engines", [replica])
+    monkeypatch.setattr(db, "_replicas", cycle([replica]))
+
+
+async def _answered_by(session) -> str:
+    serials = (await session.scalars(select(TestItem.serial))).all()
+    return "replica" if "replica" in serials else "primary"
+
+
+def test_reads_go_to_the_replica(routed):
+    async def scenario():
+        async with async_session() as session:
+            assert await _answered_by(session) == "replica"
+            with primary_reads(session):
+                assert await _answered_by(session) == "primary"
+                with primary_reads(session):
+                    assert await _answered_by(session) == "primary"
+                assert await _answered_by(session) == "primary"
+            assert await _answered_by(session) == "replica"
+
+    asyncio.run(scenario())
+
+
+def test_writes_pin_the_session_to_the_primary(routed):
+    async def scenario():
+        async with async_session() as session:
+            session.add(TestItem(serial="written"))
+            await session.flush()
+            assert await _answered_by(session) == "primary"
+            await session.commit()
+            # reads its own writes after commit
+            assert await _answered_by(session) == "primary"
+            await session.rollback()
+            assert await _answered_by(session) == "primary"
+
+        async with async_session() as session:
+            use_primary(session)
+            assert await _answered_by(session) == "primary"
+
+    asyncio.run(scenario())
+
+
+def test_rollback_unpins_before_commit(routed):
+    async def scenario():
+        async with async_session() as session:
+            session.add(TestItem(serial="rolled back"))
+            await session.flush()
+            assert await _answered_by(session) == "primary"
+            await session.rollback()
+            assert await _answered_by(session) == "replica"
+
+            use_primary(session)
+            await session.rollback()
+            assert await _answered_by(session) == "replica"
+
+    asyncio.run(scenario())
+
+
+def test_read_only_session_stays_on_the_replica(routed):
+    async def scenario():
+        async with replica_session() as session:
+            use_primary(session)
+            assert await _answered_by(session) == "replica"
+
+    asyncio.run(scenario())
+
+
+class CachedItemCRUD(TestItemCRUD):
+    __test__ = False
+    result_cache_size = 16
+
+
+def test_result_cache_is_filled_from_the_primary(routed):
+    crud = CachedItemCRUD(settings=Settings())
+
+    async def scenario():
+        async with async_session() as session:
+            items = await crud.get_multi(session)
+            assert [item.serial for item in items] == ["primary"]
+            assert await _answered_by(session) == "replica"
+        async with async_session() as session:
+            # from the cache
+            items = await crud.get_multi(session)
+            assert [item.serial for item in items] == ["primary"]
+        assert crud.result_cache_stats["hits"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from summary_bot.crud.write_behind import WriteBehindBuffer
+from tests.models import TestItem
+
+
+class BrokenSession(AsyncSession):
+    async def execute(self, *args, **kwargs):
+        raise ConnectionResetError("connection reset by peer")
+
+
+class SlowSession(AsyncSession):
+    """signals `started` and waits `delay` seconds before a statement"""
+
+    started: asyncio.Event
+    delay: float = 3600
+
+    async def execute(self, *args, **kwargs):
+        type(self).started.set()
+        await asyncio.sleep(self.delay)
+        return await super().execute(*args, **kwargs)
+
+
+def _buffer(sessions: list, window: float = 3600) -> WriteBehindBuffer:
+    # the first factory of `sessions` opens the session of a flush
+    return WriteBehindBuffer(
+        TestItem, window, 100, session_factory=lambda: sessions[0]()
+    )
+
+
+async def _create(engine, count: int) -> list[int]:
+    async with async_sessionmaker(engine)() as session:
+        session.add_all(TestItem(serial=f"s{i}") for i in range(count))
+        await session.commit()
+        return list(
+            await session.scalars(select(TestItem.id).order_by(TestItem.id))
+        )
+
+
+def test_failed_flush_is_requeued(pg_engine):
+    working = async_sessionmaker(pg_engine)
+    sessions = [async_sessionmaker(pg_engine, class_=BrokenSession), working]
+
+    async def scenario():
+        [pk] = await _create(pg_engine, 1)
+        buffer = _buffer(sessions)
+        await buffer.put(pk, {"name": "first", "state": 1})
+        with pytest.raises(ConnectionResetError):
+            await buffer.flush()
+        assert buffer.stats["pending"] == 1
+        # a newer patch of the row wins over the requeued one
+        await buffer.put(pk, {"name": "second"})
+        sessions.pop(0)
+        assert await buffer.flush() == 1
+        async with working() as session:
+            item = await session.get(TestItem, pk)
+            assert (item.name, item.state) == ("second", 1)
+        await buffer.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_flush_is_requeued(engine):
+    slow = async_sessionmaker(engine, class_=SlowSession)
+    sessions = [slow, async_sessionmaker(engine)]
+
+    async def scenario():
+        SlowSession.started = asyncio.Event()
+        [pk] = await _create(engine, 1)
+        buffer = _buffer(sessions)
+        await buffer.put(pk)
+        flush = asyncio.create_task(buffer.flush())
+        await SlowSession.started.wait()
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        assert buffer.stats["pending"] == 1
+        sessions.pop(0)
+        assert await buffer.flush() == 1
+        await buffer.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_waits_for_the_flush_in_flight(engine, monkeypatch):
+    monkeypatch.setattr(SlowSession, "delay", 0.05)
+    sessions = [async_sessionmaker(engine, class_=SlowSession)]
+
+    async def scenario():
+        SlowSession.started = asyncio.Event()
+        first, second = await _create(engine, 2)
+        buffer = _buffer(sessions, window=0.01)
+        await buffer.put(first)
+        await SlowSession.started.wait()
+        # queued while the periodic flush writes the first row
+        await buffer.put(second)
+        await buffer.close()
+        assert buffer.stats == {
+            "pending": 0,
+            "queued": 2,
+            "coalesced": 0,
+            "written": 2,
+        }
+
+    asyncio.run(scenario())